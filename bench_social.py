@@ -0,0 +1,246 @@
+"""Statements and time per call of the social actions, before and after
+
+Runs the request handlers of a CrosswordServer against a scratch database
+in a temporary directory and counts the SQL statements each call executes,
+as reported by sqlite3's trace callback (implicit BEGIN and COMMIT
+included). Calls are made in order, so reads include loading a user into
+the social graph the first time it is used.
+
+The same calls are replayed with the statements the handlers used to run
+(username-keyed friends table, existence checks and verification reads)
+against a second scratch database, for the baseline columns.
+
+    python bench_social.py [--users N]
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class StatementCounter:
+    """Counts statements executed by one thread on traced connections"""
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.count = 0
+
+    def trace(self, statement):
+        if threading.current_thread() is self.thread:
+            self.count += 1
+
+    def install(self, conn):
+        conn.set_trace_callback(self.trace)
+
+
+# Statement sequences of the social handlers before they were reworked;
+# each returns whether the call succeeded. There was no reject_friend.
+def baseline_add_friend(conn, request):
+    user_id, friend_id = request['user_id'], request['friend_id']
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE username = ?", (user_id,))
+    user = cursor.fetchone()
+    cursor.execute("SELECT * FROM users WHERE username = ?", (friend_id,))
+    friend = cursor.fetchone()
+    if not user or not friend:
+        return False
+    cursor.execute("SELECT status FROM friends WHERE user_id = ? AND friend_id = ?", (user_id, friend_id))
+    if cursor.fetchone():
+        return False
+    cursor.execute("INSERT INTO friends (user_id, friend_id, status) VALUES (?, ?, 'pending')", (user_id, friend_id))
+    conn.commit()
+    cursor.execute("SELECT * FROM friends WHERE user_id = ? AND friend_id = ?", (user_id, friend_id))
+    cursor.fetchone()
+    return True
+
+
+def baseline_confirm_friend(conn, request):
+    user_id, friend_id = request['user_id'], request['friend_id']
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT * FROM friends WHERE user_id = ? AND friend_id = ? AND status = 'pending'",
+        (friend_id, user_id)
+    )
+    if not cursor.fetchone():
+        return False
+    cursor.execute("UPDATE friends SET status = 'confirmed' WHERE user_id = ? AND friend_id = ?", (friend_id, user_id))
+    cursor.execute(
+        "INSERT OR REPLACE INTO friends (user_id, friend_id, status) VALUES (?, ?, 'confirmed')",
+        (user_id, friend_id)
+    )
+    conn.commit()
+    cursor.execute("""
+        SELECT user_id, friend_id, status FROM friends
+        WHERE (user_id = ? AND friend_id = ?) OR (user_id = ? AND friend_id = ?)
+    """, (user_id, friend_id, friend_id, user_id))
+    cursor.fetchall()
+    return True
+
+
+def baseline_get_friend_requests(conn, request):
+    user_id = request['user_id']
+    conn.execute("SELECT * FROM friends WHERE friend_id = ?", (user_id,)).fetchall()
+    conn.execute(
+        "SELECT user_id, friend_id FROM friends WHERE friend_id = ? AND status = 'pending'", (user_id,)
+    ).fetchall()
+    return True
+
+
+def baseline_get_friends(conn, request):
+    user_id = request['user_id']
+    conn.execute("""
+        SELECT DISTINCT CASE WHEN user_id = ? THEN friend_id WHEN friend_id = ? THEN user_id END
+        FROM friends
+        WHERE (user_id = ? OR friend_id = ?) AND status = 'confirmed'
+    """, (user_id, user_id, user_id, user_id)).fetchall()
+    return True
+
+
+def baseline_send_message(conn, request):
+    conn.execute(
+        "INSERT INTO messages (sender_id, receiver_id, message) VALUES (?, ?, ?)",
+        (request['sender_id'], request['receiver_id'], request['message'])
+    )
+    conn.commit()
+    return True
+
+
+def baseline_get_messages(conn, request):
+    user_id, friend_id = request['user_id'], request['friend_id']
+    if not conn.execute("""
+        SELECT * FROM friends
+        WHERE ((user_id = ? AND friend_id = ?) OR (user_id = ? AND friend_id = ?)) AND status = 'confirmed'
+    """, (user_id, friend_id, friend_id, user_id)).fetchone():
+        return False
+    conn.execute("""
+        SELECT DISTINCT sender_id, receiver_id, message, timestamp FROM messages
+        WHERE (sender_id = ? AND receiver_id = ?) OR (sender_id = ? AND receiver_id = ?)
+        ORDER BY timestamp
+    """, (user_id, friend_id, friend_id, user_id)).fetchall()
+    return True
+
+
+BASELINE = {
+    'add_friend': baseline_add_friend,
+    'confirm_friend': baseline_confirm_friend,
+    'get_friend_requests': baseline_get_friend_requests,
+    'get_friends': baseline_get_friends,
+    'send_message': baseline_send_message,
+    'get_messages': baseline_get_messages,
+}
+
+
+def measure(counter, requests, call):
+    """(statements per call, ms per call, errors) over requests; call(request) -> success"""
+    statements = errors = 0
+    started = time.perf_counter()
+    for request in requests:
+        counter.count = 0
+        if not call(request):
+            errors += 1
+        statements += counter.count
+    elapsed = time.perf_counter() - started
+    return statements / len(requests), elapsed * 1000 / len(requests), errors
+
+
+def baseline_database(path, users):
+    """Scratch database with the tables the old handlers used, on pool-like settings"""
+    from database.pool import apply_pragmas, DEFAULT_PRAGMAS
+
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, DEFAULT_PRAGMAS)
+    conn.executescript("""
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        );
+        CREATE TABLE friends (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            friend_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id TEXT NOT NULL,
+            receiver_id TEXT NOT NULL,
+            message TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            read BOOLEAN DEFAULT 0
+        );
+    """)
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, 'pw')", [(u,) for u in users])
+    conn.commit()
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help="number of users (even)")
+    args = parser.parse_args()
+    users = [f'user{i:04d}' for i in range(args.users - args.users % 2)]
+
+    # The server uses database/crossword.db relative to the working directory
+    scratch = tempfile.mkdtemp(prefix='bench_social_')
+    os.makedirs(os.path.join(scratch, 'database'))
+    source = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(scratch)
+
+    import sys
+    sys.path.insert(0, source)
+    from database import get_pool, DB_PATH
+    from server import CrosswordServer
+
+    logging.basicConfig(level=logging.WARNING)
+    counter = StatementCounter()
+    get_pool(DB_PATH).add_initializer(counter.install)
+
+    server = CrosswordServer(port=0, warmup={'enabled': False}, snapshot_interval=3600)
+    for user in users:
+        server.dispatcher.dispatch({'action': 'login', 'username': user, 'password': 'pw'})
+
+    # Each user requests the next one; even users' requests are confirmed, odd ones rejected
+    pairs = list(zip(users, users[1:] + users[:1]))
+    confirmed = pairs[::2]
+    rejected = pairs[1::2]
+    steps = [
+        ('add_friend', [{'action': 'add_friend', 'user_id': a, 'friend_id': b} for a, b in pairs]),
+        ('add_friend (duplicate)', [{'action': 'add_friend', 'user_id': a, 'friend_id': b} for a, b in pairs[:20]]),
+        ('get_friend_requests', [{'action': 'get_friend_requests', 'user_id': u} for u in users]),
+        ('confirm_friend', [{'action': 'confirm_friend', 'user_id': b, 'friend_id': a} for a, b in confirmed]),
+        ('reject_friend', [{'action': 'reject_friend', 'user_id': b, 'friend_id': a} for a, b in rejected]),
+        ('get_friends', [{'action': 'get_friends', 'user_id': u} for u in users]),
+        ('send_message', [
+            {'action': 'send_message', 'sender_id': a, 'receiver_id': b, 'message': 'hi'} for a, b in confirmed
+        ]),
+        ('get_messages', [{'action': 'get_messages', 'user_id': b, 'friend_id': a} for a, b in confirmed]),
+    ]
+
+    baseline = baseline_database(os.path.join(scratch, 'baseline.db'), users)
+    counter.install(baseline)
+
+    def dispatch(request):
+        return server.dispatcher.dispatch(request).get('status') == 'ok'
+
+    print(f"{len(users)} users, databases in {scratch}")
+    print(f"{'action':<24} {'calls':>6} {'stmts before':>13} {'stmts now':>10} "
+          f"{'ms before':>10} {'ms now':>8} {'errors':>7}")
+    for name, requests in steps:
+        old = BASELINE.get(requests[0]['action'])
+        if old is None:
+            before = '-', '-'
+        else:
+            statements, ms, _ = measure(counter, requests, lambda request: old(baseline, request))
+            before = f"{statements:.2f}", f"{ms:.3f}"
+        statements, ms, errors = measure(counter, requests, dispatch)
+        print(f"{name:<24} {len(requests):>6} {before[0]:>13} {statements:>10.2f} "
+              f"{before[1]:>10} {ms:>8.3f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import json
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """Approximate memory footprint of a JSON-serializable value, in bytes"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return len(json.dumps(value))
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and approximate size
+
+    Every invalidation bumps a version number. Callers read it with
+    version() before loading a value and pass it to put(), so a load that
+    raced with an invalidation never stores stale data.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, sizeof=estimate_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._version = 0
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def put(self, key, value, version=None):
+        """Store a value; ignored if it was loaded before the last invalidation"""
+        size = self.sizeof(value)
+        with self._lock:
+            if version is not None and version != self._version:
+                return False
+            if size > self.max_bytes:
+                return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
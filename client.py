@@ -1,4 +1,5 @@
 import socket
+import select
 import json
 import time
 import puz
@@ -6,17 +7,32 @@ import tkinter as tk
 from tkinter import messagebox
 from tkinter import filedialog
 import traceback
+import protocol
 
 class CrosswordClient:
+    # Leaderboard rows fetched per statistics request
+    STATS_PAGE_SIZE = 50
+    # Latest messages shown per conversation
+    INBOX_MESSAGES = 20
+    # How often (ms) to check the connection for pushed events while idle
+    EVENT_POLL_MS = 500
+
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Crossword Game")
         self.root.geometry("800x600")
         
+        # Unseen pushed events, shown in the window title
+        self.new_messages = 0
+        self.new_friend_requests = 0
+        # Conversations shown by the messages view, by friend
+        self.message_views = {}
+        
         # Connect to server
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.connect(('localhost', 8888))
+            self.framed = self._negotiate_protocol()
             self.show_login_screen()
             self.root.mainloop()
         except Exception as e:
@@ -28,6 +44,26 @@ class CrosswordClient:
         for widget in self.root.winfo_children():
             widget.destroy()
     
+    def _negotiate_protocol(self):
+        """Ask the server to switch to length-prefixed framing
+        
+        Returns:
+            bool: True if the server agreed, False to stay on bare JSON
+        """
+        self.sock.sendall(protocol.encode_payload({
+            'action': protocol.HELLO_ACTION,
+            'protocol_version': protocol.PROTOCOL_VERSION
+        }))
+        response = protocol.recv_legacy_message(self.sock)
+        return bool(response) and response.get('status') == 'ok'
+    
+    def _send(self, request_data):
+        """Send a request using the negotiated framing mode"""
+        if self.framed:
+            protocol.send_message(self.sock, request_data)
+        else:
+            self.sock.sendall(protocol.encode_payload(request_data))
+    
     def send_request(self, request_data):
         """Send a request to the server and get the response
         
@@ -39,7 +75,7 @@ class CrosswordClient:
         """
         try:
             # Send the request
-            self.sock.send(json.dumps(request_data).encode())
+            self._send(request_data)
             
             # Get the response
             return self.receive_response()
@@ -49,6 +85,7 @@ class CrosswordClient:
             traceback.print_exc()
             return {"status": "error", "message": f"Network error: {str(e)}"}
     
+    
     def show_login_screen(self):
         """Display login screen"""
         # Clear existing widgets
@@ -101,16 +138,17 @@ class CrosswordClient:
             return
         
         try:
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'login',
                 'username': username,
                 'password': password
-            }).encode())
+            })
             
             response = self.receive_response()
             
             if response['status'] == 'ok':
                 self.current_user = username
+                self._subscribe_events()
                 self.show_main_menu()
             else:
                 messagebox.showerror("Error", response.get('message', 'Login failed'))
@@ -339,32 +377,74 @@ class CrosswordClient:
     def receive_response(self):
         """Receive and parse response from server"""
         try:
-            data_buffer = b""
             while True:
-                chunk = self.sock.recv(4096)
-                if not chunk:
+                if self.framed:
+                    response = protocol.recv_message(self.sock)
+                else:
+                    response = protocol.recv_legacy_message(self.sock)
+                if response is None:
+                    raise ConnectionError("Connection closed by server")
+                if not self._is_event(response):
                     break
-                data_buffer += chunk
-                try:
-                    # Try to parse the accumulated data
-                    response = json.loads(data_buffer.decode())
-                    if 'pending_requests' not in response:
-                        response['pending_requests'] = []  # Add empty list if missing
-                    return response
-                except json.JSONDecodeError as e:
-                    if "Unterminated string" not in str(e):
-                        # If it's not an unterminated string, it's a real error
-                        print(f"JSON Decode Error: {str(e)}")
-                        print(f"Received data: {data_buffer.decode()}")
-                        raise
-                    # If it's an unterminated string, continue receiving data
-                    continue
+                # Pushed event that arrived before the response
+                self._handle_event(response)
+            if 'pending_requests' not in response:
+                response['pending_requests'] = []  # Add empty list if missing
+            return response
         except Exception as e:
             print(f"Error receiving response: {str(e)}")
             print("Full error:")
             traceback.print_exc()
             raise
 
+    def _subscribe_events(self):
+        """Ask the server to push new messages and friend requests for the current user"""
+        if not self.framed:
+            return
+        self._send({'action': 'subscribe', 'user_id': self.current_user})
+        if self.receive_response()['status'] == 'ok':
+            self.root.after(self.EVENT_POLL_MS, self._poll_events)
+
+    def _poll_events(self):
+        """Handle pushed events waiting on the connection, then check again later"""
+        try:
+            while select.select([self.sock], [], [], 0)[0]:
+                message = protocol.recv_message(self.sock)
+                if message is None:
+                    return
+                if self._is_event(message):
+                    self._handle_event(message)
+        except (OSError, protocol.ProtocolError) as e:
+            print(f"Stopped listening for events: {str(e)}")
+            return
+        self.root.after(self.EVENT_POLL_MS, self._poll_events)
+
+    @staticmethod
+    def _is_event(message):
+        return 'event' in message and 'status' not in message
+
+    def _handle_event(self, event):
+        """Count a pushed event and show it in the window title"""
+        if event['event'] == 'message':
+            # Open conversations fetch what arrived; events can come in mid-request
+            sender = event['data']['sender_id']
+            view = self.message_views.get(sender)
+            if view is not None and view['frame'].winfo_exists():
+                self.root.after_idle(self._load_new_messages, sender)
+                return
+            self.new_messages += 1
+        elif event['event'] == 'friend_request':
+            self.new_friend_requests += 1
+        self._update_title()
+
+    def _update_title(self):
+        notices = []
+        if self.new_messages:
+            notices.append(f"{self.new_messages} new message{'s' if self.new_messages != 1 else ''}")
+        if self.new_friend_requests:
+            notices.append(f"{self.new_friend_requests} friend request{'s' if self.new_friend_requests != 1 else ''}")
+        self.root.title("Crossword Game" + (f" ({', '.join(notices)})" if notices else ""))
+
     def show_puzzle(self, puzzle_id, challenge_mode=False):
         """Display puzzle"""
         
@@ -376,10 +456,10 @@ class CrosswordClient:
         try:
             print(f"\n=== Debug: Requesting puzzle {puzzle_id} ===")
 
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'get_puzzle_detail',
                 'puzzle_id': puzzle_id
-            }).encode())
+            })
             
             print("Waiting for server response...")
             response = self.receive_response()
@@ -665,14 +745,14 @@ class CrosswordClient:
             final_time = int(time.time() - self.start_time)
             
             # Send solution to server
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'submit_solution',
                 'username': self.current_user,
                 'puzzle_id': puzzle_id,
                 'solution': json.dumps(solution),
                 'time_taken': final_time,
                 'challenge_mode': getattr(self, 'challenge_mode', False)
-            }).encode())
+            })
             
             response = self.receive_response()
             
@@ -1105,10 +1185,10 @@ class CrosswordClient:
                 print(json.dumps(request_data, indent=2))
                 
                 print("\nSending data to server...")
-                self.sock.send(json.dumps(request_data).encode())
+                self._send(request_data)
                 
                 print("Waiting for server response...")
-                response = json.loads(self.sock.recv(4096).decode())
+                response = self.receive_response()
                 print(f"Server response: {response}")
                 
                 if response['status'] == 'ok':
@@ -1144,10 +1224,13 @@ class CrosswordClient:
     def show_statistics(self):
         """Display statistics"""
         try:
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'get_statistics',
-                'username': self.current_user
-            }).encode())
+                'username': self.current_user,
+                'mode': 'top',
+                'limit': self.STATS_PAGE_SIZE,
+                'around': 0
+            })
             
             response = self.receive_response()
             
@@ -1198,7 +1281,32 @@ class CrosswordClient:
                 lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
             )
             canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
+            
+            # Further leaderboard pages are fetched when the view nears the end
+            paging = {'cursor': response.get('next_cursor'), 'loading': False}
+            
+            def on_scroll(first, last):
+                scrollbar.set(first, last)
+                if paging['cursor'] is not None and not paging['loading'] and float(last) >= 0.95:
+                    paging['loading'] = True
+                    self.root.after_idle(load_next_page)
+            
+            def load_next_page():
+                if not scrollable_frame.winfo_exists():
+                    return
+                try:
+                    page = self._fetch_statistics_page(paging['cursor'])
+                except Exception:
+                    page = None
+                if page is None:
+                    paging['cursor'] = None
+                    return
+                for user_stats in page['all_users_stats']:
+                    self._add_statistics_row(scrollable_frame, user_stats)
+                paging['cursor'] = page.get('next_cursor')
+                paging['loading'] = False
+            
+            canvas.configure(yscrollcommand=on_scroll)
             
             canvas.pack(side="left", fill="both", expand=True)
             scrollbar.pack(side="right", fill="y")
@@ -1237,6 +1345,16 @@ class CrosswordClient:
                     justify=tk.LEFT
                 ).pack(anchor='w', padx=20, pady=5)
 
+            if response.get('rank') is not None:
+                tk.Label(
+                    current_user_frame,
+                    text=f"Leaderboard Position: {response['rank']}",
+                    font=("Helvetica", 12),
+                    bg='white',
+                    fg='black',
+                    justify=tk.LEFT
+                ).pack(anchor='w', padx=20)
+
             # Display leaderboard
             tk.Label(
                 scrollable_frame,
@@ -1295,55 +1413,9 @@ class CrosswordClient:
                 fg='black'
             ).pack(side="left")
             
-            # Display all users' statistics
+            # Display the first page of users' statistics
             for user_stats in response['all_users_stats']:
-                user_frame = tk.Frame(scrollable_frame, bg='white')
-                user_frame.pack(fill="x", padx=20)
-
-                tk.Label(
-                    user_frame,
-                    text=user_stats['username'],
-                    font=("Helvetica", 12),
-                    width=20,
-                    bg='white',
-                    fg='black'
-                ).pack(side="left")
-                
-                tk.Label(
-                    user_frame,
-                    text=str(user_stats['puzzles_solved']),
-                    font=("Helvetica", 12),
-                    width=15,
-                    bg='white',
-                    fg='black'
-                ).pack(side="left")
-                
-                tk.Label(
-                    user_frame,
-                    text=str(user_stats.get('fastest_time', 'N/A')),
-                    font=("Helvetica", 12),
-                    width=15,
-                    bg='white',
-                    fg='black'
-                ).pack(side="left")
-
-                tk.Label(
-                    user_frame,
-                    text=str(user_stats.get('average_time', 'N/A')),
-                    font=("Helvetica", 12),
-                    width=15,
-                    bg='white',
-                    fg='black'
-                ).pack(side="left")
-
-                tk.Label(
-                    user_frame,
-                    text=str(user_stats['puzzles_created']),
-                    font=("Helvetica", 12),
-                    width=15,
-                    bg='white',
-                    fg='black'
-                ).pack(side="left")
+                self._add_statistics_row(scrollable_frame, user_stats)
             
             # Add button to view historical rankings
             view_button = tk.Button(self.root, text="View Historical Rankings", 
@@ -1353,6 +1425,67 @@ class CrosswordClient:
         except Exception as e:
             messagebox.showerror("Error", f"Network error: {str(e)}")
 
+    def _fetch_statistics_page(self, cursor):
+        """Fetch the leaderboard page following cursor, or None on error"""
+        self._send({
+            'action': 'get_statistics',
+            'username': self.current_user,
+            'limit': self.STATS_PAGE_SIZE,
+            'cursor': cursor
+        })
+        response = self.receive_response()
+        return response if response.get('status') == 'ok' else None
+
+    def _add_statistics_row(self, parent, user_stats):
+        """Add one user's row to the leaderboard"""
+        user_frame = tk.Frame(parent, bg='white')
+        user_frame.pack(fill="x", padx=20)
+
+        tk.Label(
+            user_frame,
+            text=user_stats['username'],
+            font=("Helvetica", 12),
+            width=20,
+            bg='white',
+            fg='black'
+        ).pack(side="left")
+
+        tk.Label(
+            user_frame,
+            text=str(user_stats['puzzles_solved']),
+            font=("Helvetica", 12),
+            width=15,
+            bg='white',
+            fg='black'
+        ).pack(side="left")
+
+        tk.Label(
+            user_frame,
+            text=str(user_stats.get('fastest_time', 'N/A')),
+            font=("Helvetica", 12),
+            width=15,
+            bg='white',
+            fg='black'
+        ).pack(side="left")
+
+        tk.Label(
+            user_frame,
+            text=str(user_stats.get('average_time', 'N/A')),
+            font=("Helvetica", 12),
+            width=15,
+            bg='white',
+            fg='black'
+        ).pack(side="left")
+
+        tk.Label(
+            user_frame,
+            text=str(user_stats['puzzles_created']),
+            font=("Helvetica", 12),
+            width=15,
+            bg='white',
+            fg='black'
+        ).pack(side="left")
+
     def show_historical_rankings(self):
         """Show historical rankings for the current user"""
         # Clear main window
@@ -1609,7 +1742,7 @@ class CrosswordClient:
             }
 
             print(f"Debug: Sending friend request - {request_data}")  # Debug log
-            self.sock.send(json.dumps(request_data).encode())
+            self._send(request_data)
 
             response = self.receive_response()
 
@@ -1636,10 +1769,10 @@ class CrosswordClient:
         ).pack(pady=40)
 
         try:
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'get_friends',
                 'user_id': self.current_user
-            }).encode())
+            })
 
             response = self.receive_response()
 
@@ -1726,12 +1859,12 @@ class CrosswordClient:
             return
 
         try:
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'send_message',
                 'sender_id': self.current_user,
                 'receiver_id': friend_username,
                 'message': message
-            }).encode())
+            })
             
             response = self.receive_response()
             
@@ -1744,11 +1877,14 @@ class CrosswordClient:
 
     def show_friend_requests(self):
         """Display all pending friend requests"""
+        self.new_friend_requests = 0
+        self._update_title()
+
         try:
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'get_friend_requests',
                 'user_id': self.current_user
-            }).encode())
+            })
 
             response = self.receive_response()
             print(f"Debug: Received pending friend requests response - {response}")  # Debug log
@@ -1828,11 +1964,11 @@ class CrosswordClient:
     def accept_friend_request(self, friend_id):
         """Accept a friend request"""
         try:
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'confirm_friend',
                 'user_id': self.current_user,
                 'friend_id': friend_id
-            }).encode())
+            })
             
             response = self.receive_response()
             
@@ -1847,11 +1983,11 @@ class CrosswordClient:
     def reject_friend_request(self, friend_id):
         """Reject a friend request"""
         try:
-            self.sock.send(json.dumps({
+            self._send({
                 'action': 'reject_friend',
                 'user_id': self.current_user,
                 'friend_id': friend_id
-            }).encode())
+            })
             
             response = self.receive_response()
             
@@ -1865,6 +2001,10 @@ class CrosswordClient:
 
     def show_view_messages(self):
         """Display message history with friends"""
+        self.new_messages = 0
+        self._update_title()
+        self.message_views = {}
+
         # Clear existing widgets
         for widget in self.root.winfo_children():
             widget.destroy()
@@ -1877,21 +2017,23 @@ class CrosswordClient:
         ).pack(pady=20)
 
         try:
-            # First get the friends list
-            self.sock.send(json.dumps({
-                'action': 'get_friends',
-                'user_id': self.current_user
-            }).encode())
+            # Latest messages and unread counts of every conversation, in one request
+            self._send({
+                'action': 'get_inbox',
+                'user_id': self.current_user,
+                'limit': self.INBOX_MESSAGES,
+                'mark_read': True
+            })
 
             response = self.receive_response()
 
             if response['status'] != 'ok':
-                messagebox.showerror("Error", response.get('message', 'Failed to get friends list'))
+                messagebox.showerror("Error", response.get('message', 'Failed to get messages'))
                 return
 
-            friends = response['friends']
+            conversations = response['conversations']
 
-            if not friends:
+            if not conversations:
                 tk.Label(
                     self.root,
                     text="You don't have any friends yet",
@@ -1913,66 +2055,71 @@ class CrosswordClient:
                 )
 
                 canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-                canvas.configure(yscrollcommand=scrollbar.set)
 
-                # For each friend, get and display messages
-                for friend in friends:
+                # Older history of a conversation is fetched when its start is scrolled into view
+                def on_scroll(first, last):
+                    scrollbar.set(first, last)
+                    top = canvas.canvasy(0)
+                    bottom = canvas.canvasy(canvas.winfo_height())
+                    for view in self.message_views.values():
+                        marker = view['earlier']
+                        if marker is None or view['loading'] or not marker.winfo_exists():
+                            continue
+                        y = marker.winfo_rooty() - scrollable_frame.winfo_rooty()
+                        if top <= y <= bottom:
+                            view['loading'] = True
+                            self.root.after_idle(self._load_earlier_messages, view, canvas, scrollable_frame)
+
+                canvas.configure(yscrollcommand=on_scroll)
+
+                # For each conversation, display the latest messages
+                for conversation in conversations:
+                    friend = conversation['friend']
+
                     # Create a frame for this friend's messages
                     friend_frame = tk.Frame(scrollable_frame, bg='white')
                     friend_frame.pack(fill="x", pady=10)
 
+                    unread = conversation['unread']
                     tk.Label(
                         friend_frame,
-                        text=f"Messages with {friend}:",
+                        text=f"Messages with {friend} ({unread} new):" if unread else f"Messages with {friend}:",
                         font=("Helvetica", 12, "bold"),
                         bg='white'
                     ).pack(anchor="w")
 
-                    # Get messages with this friend
-                    self.sock.send(json.dumps({
-                        'action': 'get_messages',
-                        'user_id': self.current_user,
-                        'friend_id': friend
-                    }).encode())
-
-                    msg_response = self.receive_response()
-
-                    if msg_response['status'] == 'ok':
-                        messages = msg_response['messages']
-                        if messages:
-                            for msg in messages:
-                                sender = msg['sender_id']
-                                message = msg['message']
-                                timestamp = msg['timestamp']
-                                
-                                # Format the message
-                                if sender == self.current_user:
-                                    prefix = "You: "
-                                    bg_color = '#E3F2FD'  # Light blue for sent messages
-                                else:
-                                    prefix = f"{sender}: "
-                                    bg_color = '#F5F5F5'  # Light grey for received messages
-
-                                # Create message bubble
-                                msg_frame = tk.Frame(friend_frame, bg=bg_color)
-                                msg_frame.pack(fill="x", pady=2, padx=10)
-                                
-                                tk.Label(
-                                    msg_frame,
-                                    text=f"{prefix}{message}",
-                                    wraplength=400,
-                                    justify="left",
-                                    bg=bg_color,
-                                    padx=10,
-                                    pady=5
-                                ).pack(anchor="w")
-                        else:
-                            tk.Label(
-                                friend_frame,
-                                text="No messages yet",
-                                font=("Helvetica", 10),
-                                bg='white'
-                            ).pack(pady=5)
+                    messages = conversation['messages']
+                    view = {
+                        'friend': friend,
+                        'frame': friend_frame,
+                        'earlier': None,
+                        'loading': False,
+                        'oldest_id': messages[0]['id'] if messages else None,
+                        'newest_id': messages[-1]['id'] if messages else None
+                    }
+                    self.message_views[friend] = view
+
+                    if conversation.get('has_more'):
+                        view['earlier'] = tk.Label(
+                            friend_frame,
+                            text="Scroll up for earlier messages",
+                            font=("Helvetica", 9, "italic"),
+                            bg='white',
+                            fg='grey'
+                        )
+                        view['earlier'].pack(anchor="w", padx=10)
+
+                    if messages:
+                        for msg in messages:
+                            self._add_message_row(friend_frame, msg)
+                    else:
+                        view['empty'] = tk.Label(
+                            friend_frame,
+                            text="No messages yet",
+                            font=("Helvetica", 10),
+                            bg='white'
+                        )
+                        view['empty'].pack(pady=5)
 
                 # Pack the canvas and scrollbar
                 canvas.pack(side="left", fill="both", expand=True)
@@ -1993,5 +2140,106 @@ class CrosswordClient:
             pady=5
         ).pack(pady=20)
 
+    def _fetch_messages(self, friend, **cursor):
+        """Fetch a page of the conversation with friend, or None on error"""
+        request = {'action': 'get_messages', 'user_id': self.current_user, 'friend_id': friend}
+        request.update(cursor)
+        self._send(request)
+        response = self.receive_response()
+        return response if response.get('status') == 'ok' else None
+
+    def _add_message_row(self, parent, msg, before=None):
+        """Add one message bubble to a conversation, optionally above widget `before`"""
+        sender = msg['sender_id']
+
+        # Format the message
+        if sender == self.current_user:
+            prefix = "You: "
+            bg_color = '#E3F2FD'  # Light blue for sent messages
+        else:
+            prefix = f"{sender}: "
+            bg_color = '#F5F5F5'  # Light grey for received messages
+
+        # Create message bubble
+        msg_frame = tk.Frame(parent, bg=bg_color)
+        if before is not None:
+            msg_frame.pack(fill="x", pady=2, padx=10, before=before)
+        else:
+            msg_frame.pack(fill="x", pady=2, padx=10)
+
+        tk.Label(
+            msg_frame,
+            text=f"{prefix}{msg['message']}",
+            wraplength=400,
+            justify="left",
+            bg=bg_color,
+            padx=10,
+            pady=5
+        ).pack(anchor="w")
+        return msg_frame
+
+    def _load_earlier_messages(self, view, canvas, scrollable_frame):
+        """Insert the page of history before a conversation's oldest shown message
+
+        The view is scrolled by the added height so the messages on screen
+        stay in place and the next page loads only when scrolled to again.
+        """
+        marker = view['earlier']
+        if marker is None or not marker.winfo_exists():
+            return
+        try:
+            page = self._fetch_messages(view['friend'], before=view['oldest_id'], limit=self.INBOX_MESSAGES)
+        except Exception:
+            page = None
+        if page is None:
+            marker.destroy()
+            view['earlier'] = None
+            return
+
+        scrollable_frame.update_idletasks()
+        top = canvas.canvasy(0)
+        height = scrollable_frame.winfo_height()
+
+        # The first message shown sits right after the marker
+        slaves = view['frame'].pack_slaves()
+        first_shown = slaves[slaves.index(marker) + 1]
+        for msg in page['messages']:
+            self._add_message_row(view['frame'], msg, before=first_shown)
+        if page['messages']:
+            view['oldest_id'] = page['messages'][0]['id']
+        if not page['has_more']:
+            marker.destroy()
+            view['earlier'] = None
+
+        scrollable_frame.update_idletasks()
+        canvas.configure(scrollregion=canvas.bbox("all"))
+        added = scrollable_frame.winfo_height() - height
+        canvas.yview_moveto((top + added) / max(scrollable_frame.winfo_height(), 1))
+        view['loading'] = False
+
+    def _load_new_messages(self, friend):
+        """Append messages of an open conversation that arrived after the newest one shown"""
+        view = self.message_views.get(friend)
+        if view is None or not view['frame'].winfo_exists():
+            return
+        try:
+            if view['newest_id'] is None:
+                page = self._fetch_messages(friend)
+            else:
+                page = self._fetch_messages(friend, since=view['newest_id'])
+        except Exception:
+            return
+        if page is None or not page['messages']:
+            return
+        if view.get('empty') is not None:
+            view['empty'].destroy()
+            view['empty'] = None
+        for msg in page['messages']:
+            if view['newest_id'] is None or msg['id'] > view['newest_id']:
+                self._add_message_row(view['frame'], msg)
+        view['newest_id'] = page['messages'][-1]['id']
+        if view['oldest_id'] is None:
+            view['oldest_id'] = page['messages'][0]['id']
+
 if __name__ == "__main__":
     CrosswordClient()
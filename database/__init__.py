@@ -1,20 +1,25 @@
-import sqlite3
-import importlib
+from .pool import get_pool
+
+DB_PATH = 'database/crossword.db'
 
 def get_db_connection():
     """Get a connection to the SQLite database.
     Used by the server to access the database.
+    Connections come from a shared pool; close() returns them to it.
     """
-    # Connect to the database
-    conn = sqlite3.connect('database/crossword.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_pool(DB_PATH).connection()
 
 def init_db():
-    """Initialize the database by running the init_db script."""
-    # Dynamically reload to execute the module top-level code
-    import database.init_db
-    importlib.reload(database.init_db)
+    """Create the base schema and sample data if they are missing.
+    Servers use database.migrations.ensure_schema, which skips this
+    entirely once the database has a schema version.
+    """
+    from .init_db import initialize
+    conn = get_db_connection()
+    try:
+        initialize(conn)
+    finally:
+        conn.close()
 
 # Import the DatabaseManager class for extended database operations
 from .manager_db import DatabaseManager
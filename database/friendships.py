@@ -0,0 +1,127 @@
+# Social graph keyed by integer user ids, one row per pair of users.
+# The pair is stored in canonical order (user_low < user_high) so a
+# friendship is found with a single primary key lookup whichever side
+# asks; requester tells who sent the request and status is 'pending'
+# until the other user confirms it.
+
+CREATE_FRIENDSHIPS_TABLE = '''
+CREATE TABLE IF NOT EXISTS friendships (
+    user_low INTEGER NOT NULL REFERENCES users(id),
+    user_high INTEGER NOT NULL REFERENCES users(id),
+    requester INTEGER NOT NULL REFERENCES users(id),
+    status TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_low, user_high),
+    CHECK (user_low < user_high)
+)
+'''
+
+# Relationships of a user stored as the higher id of the pair
+CREATE_FRIENDSHIPS_INDEX = '''
+CREATE INDEX IF NOT EXISTS idx_friendships_high ON friendships (user_high, user_low)
+'''
+
+
+def migrate_friends(conn):
+    """Move the username-keyed friends rows into friendships and drop friends
+
+    Confirmed friendships were stored as two rows, one per direction. A
+    pair's confirmed rows are taken first, oldest first, so the original
+    request keeps its requester; rows naming unknown users are dropped.
+    """
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO friendships (user_low, user_high, requester, status, created_at)
+        SELECT MIN(a.id, b.id), MAX(a.id, b.id), a.id,
+               CASE WHEN f.status = 'confirmed' THEN 'confirmed' ELSE 'pending' END,
+               f.created_at
+        FROM friends f
+        JOIN users a ON a.username = f.user_id
+        JOIN users b ON b.username = f.friend_id
+        WHERE a.id != b.id
+        ORDER BY f.status = 'confirmed' DESC, f.id
+        """
+    )
+    conn.execute("DROP TABLE friends")
+
+
+# Write paths resolve usernames inside the statement and rely on the
+# table's constraints (primary key per pair, CHECK on the order) instead
+# of reading first; RETURNING gives the pair back without another query.
+# Each returns (user_low, user_high, requester), or None if no row
+# matched; callers commit.
+
+def insert_request(conn, username, friend_name):
+    """Add a pending request from username to friend_name
+
+    Raises sqlite3.IntegrityError if the pair already has a row.
+    """
+    return conn.execute(
+        """
+        INSERT INTO friendships (user_low, user_high, requester, status)
+        SELECT MIN(u.id, f.id), MAX(u.id, f.id), u.id, 'pending'
+        FROM users u JOIN users f ON f.username = :friend
+        WHERE u.username = :user
+        RETURNING user_low, user_high, requester
+        """,
+        {'user': username, 'friend': friend_name}
+    ).fetchone()
+
+
+# The pair of :user and :requester, with :requester as the requester
+PENDING_REQUEST = """
+    (user_low, user_high, requester) = (
+        SELECT MIN(u.id, r.id), MAX(u.id, r.id), r.id
+        FROM users u JOIN users r ON r.username = :requester
+        WHERE u.username = :user
+    )
+    AND status = 'pending'
+"""
+
+
+def confirm_request(conn, username, requester_name):
+    """Confirm the pending request from requester_name to username"""
+    return conn.execute(
+        f"""
+        UPDATE friendships SET status = 'confirmed'
+        WHERE {PENDING_REQUEST}
+        RETURNING user_low, user_high, requester
+        """,
+        {'user': username, 'requester': requester_name}
+    ).fetchone()
+
+
+def delete_request(conn, username, requester_name):
+    """Remove the pending request from requester_name to username"""
+    return conn.execute(
+        f"""
+        DELETE FROM friendships
+        WHERE {PENDING_REQUEST}
+        RETURNING user_low, user_high, requester
+        """,
+        {'user': username, 'requester': requester_name}
+    ).fetchone()
+
+
+def load_user_id(conn, username):
+    row = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    return row[0] if row else None
+
+
+def load_relationships(conn, user_id):
+    """(other_id, other_username, requester, status) of every pair including user_id"""
+    return conn.execute(
+        """
+        SELECT f.other, u.username, f.requester, f.status
+        FROM (
+            SELECT user_high AS other, requester, status, rowid AS position
+            FROM friendships WHERE user_low = :user
+            UNION ALL
+            SELECT user_low, requester, status, rowid
+            FROM friendships WHERE user_high = :user
+        ) f
+        JOIN users u ON u.id = f.other
+        ORDER BY f.position
+        """,
+        {'user': user_id}
+    ).fetchall()
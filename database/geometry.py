@@ -0,0 +1,157 @@
+import json
+
+# Clue geometry: for every numbered cell of a puzzle grid, the start
+# position and length of the across and down entries. It only depends on
+# the grid, so it is computed once when a puzzle is stored and read back
+# with the puzzle instead of rescanning the grid on every request.
+
+CREATE_GEOMETRY_TABLE = '''
+CREATE TABLE IF NOT EXISTS puzzle_clue_geometry (
+    puzzle_id INTEGER NOT NULL,
+    direction TEXT NOT NULL CHECK(direction IN ('across', 'down')),
+    number INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (puzzle_id, direction, number),
+    FOREIGN KEY (puzzle_id) REFERENCES puzzles(id)
+) WITHOUT ROWID
+'''
+
+
+def _is_black(cell):
+    if isinstance(cell, dict):
+        return cell.get('is_black', False)
+    return cell == '.'
+
+
+def compute_clue_geometry(grid):
+    """Number the grid and measure the entries starting at each numbered cell
+
+    Numbering follows the original client/server rules: a white cell gets
+    a number when it is in the first row or column, or when the cell to
+    its left or above is a dict cell marked black.
+
+    Returns:
+        dict: {'across': {number: (row, col, length)}, 'down': {...}}
+    """
+    grid_height = len(grid)
+    grid_width = len(grid[0]) if grid_height > 0 else 0
+
+    black = [[_is_black(grid[row][col]) for col in range(grid_width)] for row in range(grid_height)]
+
+    # Length of the white run starting at each cell, filled from the far edge
+    across_run = [[0] * (grid_width + 1) for _ in range(grid_height)]
+    for row in range(grid_height):
+        for col in range(grid_width - 1, -1, -1):
+            across_run[row][col] = 0 if black[row][col] else across_run[row][col + 1] + 1
+    down_run = [[0] * grid_width for _ in range(grid_height + 1)]
+    for row in range(grid_height - 1, -1, -1):
+        for col in range(grid_width):
+            down_run[row][col] = 0 if black[row][col] else down_run[row + 1][col] + 1
+
+    geometry = {'across': {}, 'down': {}}
+    number = 1
+    for row in range(grid_height):
+        for col in range(grid_width):
+            if black[row][col]:
+                continue
+            left = grid[row][col - 1] if col > 0 else None
+            above = grid[row - 1][col] if row > 0 else None
+            starts_across = col == 0 or (isinstance(left, dict) and left.get('is_black', True))
+            starts_down = row == 0 or (isinstance(above, dict) and above.get('is_black', True))
+            if starts_across or starts_down:
+                geometry['across'][number] = (row, col, across_run[row][col])
+                geometry['down'][number] = (row, col, down_run[row][col])
+                number += 1
+    return geometry
+
+
+def apply_clue_geometry(clues, geometry):
+    """Set row/col/len on numbered clue dicts from precomputed geometry"""
+    for direction in ('across', 'down'):
+        positions = geometry.get(direction, {})
+        for clue in clues.get(direction, []):
+            if isinstance(clue, dict) and 'number' in clue:
+                position = positions.get(clue['number'])
+                if position is not None:
+                    clue['row'], clue['col'], clue['len'] = position
+
+
+def store_clue_geometry(conn, puzzle_id, geometry):
+    """Replace the stored geometry of a puzzle (caller commits)"""
+    conn.execute("DELETE FROM puzzle_clue_geometry WHERE puzzle_id = ?", (puzzle_id,))
+    insert_clue_geometry(conn, [(puzzle_id, geometry)])
+
+
+def insert_clue_geometry(conn, puzzles):
+    """Store geometry of puzzles that have none yet, in one batch (caller commits)
+
+    Args:
+        puzzles: iterable of (puzzle_id, geometry)
+    """
+    conn.executemany(
+        """
+        INSERT INTO puzzle_clue_geometry (puzzle_id, direction, number, row, col, length)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (puzzle_id, direction, number, row, col, length)
+            for puzzle_id, geometry in puzzles
+            for direction, positions in geometry.items()
+            for number, (row, col, length) in positions.items()
+        ]
+    )
+
+
+def load_clue_geometry(conn, puzzle_id):
+    """Return stored geometry for a puzzle, or None if it was never computed"""
+    rows = conn.execute(
+        "SELECT direction, number, row, col, length FROM puzzle_clue_geometry WHERE puzzle_id = ?",
+        (puzzle_id,)
+    ).fetchall()
+    if not rows:
+        return None
+    geometry = {'across': {}, 'down': {}}
+    for direction, number, row, col, length in rows:
+        geometry[direction][number] = (row, col, length)
+    return geometry
+
+
+def backfill_clue_geometry(conn):
+    """Compute geometry for puzzles that have none stored (caller commits)
+
+    Puzzles whose grid cannot be parsed are skipped; they keep failing the
+    same way at read time as before.
+
+    Returns:
+        tuple: (puzzles backfilled, puzzles skipped)
+    """
+    rows = conn.execute("""
+        SELECT id, grid FROM puzzles p
+        WHERE NOT EXISTS (SELECT 1 FROM puzzle_clue_geometry g WHERE g.puzzle_id = p.id)
+    """).fetchall()
+    done = skipped = 0
+    for puzzle_id, raw_grid in rows:
+        try:
+            grid = json.loads(raw_grid) if isinstance(raw_grid, str) else raw_grid
+            geometry = compute_clue_geometry(grid)
+        except Exception:
+            skipped += 1
+            continue
+        store_clue_geometry(conn, puzzle_id, geometry)
+        done += 1
+    return done, skipped
+
+
+if __name__ == '__main__':
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        conn.execute(CREATE_GEOMETRY_TABLE)
+        done, skipped = backfill_clue_geometry(conn)
+        conn.commit()
+        print(f"Backfilled clue geometry for {done} puzzle(s), skipped {skipped}")
+    finally:
+        conn.close()
@@ -0,0 +1,18 @@
+# Watermarks of incremental background jobs, stored in job_state: each job
+# remembers the last source row id it processed, so the next run only
+# looks at rows added since.
+
+
+def get_watermark(conn, name):
+    row = conn.execute("SELECT last_id FROM job_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_watermark(conn, name, last_id):
+    conn.execute(
+        """
+        INSERT INTO job_state (name, last_id) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id
+        """,
+        (name, last_id)
+    )
@@ -3,6 +3,7 @@ import json
 import time
 import os
 from datetime import datetime
+from .pool import get_pool
 
 class DatabaseManager:
     """Database manager for the crossword puzzle application"""
@@ -16,10 +17,8 @@ class DatabaseManager:
             self._init_db()
     
     def _get_connection(self):
-        """Get a database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-        return conn
+        """Get a pooled database connection (rows behave like dictionaries)"""
+        return get_pool(self.db_path).connection()
     
     def _init_db(self):
         """Initialize the database if it doesn't exist"""
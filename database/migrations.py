@@ -0,0 +1,184 @@
+import sqlite3
+import time
+from .geometry import CREATE_GEOMETRY_TABLE, backfill_clue_geometry
+from .friendships import CREATE_FRIENDSHIPS_TABLE, CREATE_FRIENDSHIPS_INDEX, migrate_friends
+from .user_stats import (
+    CREATE_USER_STATS_TABLE, CREATE_USER_STATS_ORDER_INDEX, CREATE_USER_STATS_TRIGGER, CREATE_USER_STATS_COUNTERS_TRIGGER,
+    rebuild_user_stats
+)
+
+# Ordered schema migrations: (version, name, steps).
+# A step is either an SQL statement or a callable taking the connection.
+# Versions are applied once, in order, and recorded in schema_version;
+# never edit a released migration, add a new one instead.
+MIGRATIONS = [
+    (1, 'index puzzle_records', [
+        # Rank / total solver counts per puzzle
+        "CREATE INDEX IF NOT EXISTS idx_puzzle_records_puzzle_time ON puzzle_records (puzzle_id, time_taken)",
+        # Per-user fastest/average times (covering for MIN/AVG GROUP BY username)
+        "CREATE INDEX IF NOT EXISTS idx_puzzle_records_user_time ON puzzle_records (username, time_taken)",
+        # Latest solve and history per user
+        "CREATE INDEX IF NOT EXISTS idx_puzzle_records_user_solved ON puzzle_records (username, solved_at)",
+    ]),
+    (2, 'index messages', [
+        # Conversation history between two users, paged by message id in either direction
+        "CREATE INDEX IF NOT EXISTS idx_messages_sender_receiver_id ON messages (sender_id, receiver_id, id)",
+    ]),
+    (3, 'index rankings and leaderboards', [
+        "CREATE INDEX IF NOT EXISTS idx_historical_rankings_user_puzzle ON historical_rankings (user_id, puzzle_id)",
+        "CREATE INDEX IF NOT EXISTS idx_leaderboards_puzzle_time ON leaderboards (puzzle_id, solve_time)",
+    ]),
+    (4, 'precomputed clue geometry', [
+        CREATE_GEOMETRY_TABLE,
+        backfill_clue_geometry,
+    ]),
+    (5, 'historical ranking snapshots', [
+        # Link snapshots to the solve record they rank
+        "ALTER TABLE historical_rankings ADD COLUMN record_id INTEGER REFERENCES puzzle_records(id)",
+        "CREATE INDEX IF NOT EXISTS idx_historical_rankings_record ON historical_rankings (record_id, id)",
+        # Watermarks of incremental background jobs
+        """
+        CREATE TABLE IF NOT EXISTS job_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+    ]),
+    (6, 'materialized user statistics', [
+        CREATE_USER_STATS_TABLE,
+        CREATE_USER_STATS_ORDER_INDEX,
+        # Rows and counters follow users whatever path writes them
+        CREATE_USER_STATS_TRIGGER,
+        CREATE_USER_STATS_COUNTERS_TRIGGER,
+        rebuild_user_stats,
+    ]),
+    (7, 'index inbox messages', [
+        # Messages received by a user, per sender, and their unread counts
+        "CREATE INDEX IF NOT EXISTS idx_messages_receiver_sender_time ON messages (receiver_id, sender_id, timestamp)",
+    ]),
+    (8, 'integer-keyed friendships', [
+        # One row per pair of user ids replaces the two username rows of friends
+        CREATE_FRIENDSHIPS_TABLE,
+        CREATE_FRIENDSHIPS_INDEX,
+        migrate_friends,
+    ]),
+]
+
+
+# RETURNING (friendships writes) needs SQLite 3.35; window functions and
+# json_each are used by the statistics, ranking and inbox queries
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+
+def check_sqlite(conn):
+    """Raise RuntimeError if the SQLite library lacks features the server uses"""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(
+            f"SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required, "
+            f"found {sqlite3.sqlite_version}"
+        )
+    try:
+        conn.execute("SELECT value FROM json_each('[]')").fetchall()
+    except sqlite3.OperationalError:
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} was built without JSON support (json_each)")
+
+
+def _ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            duration_ms REAL
+        )
+    ''')
+    conn.commit()
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 if none)"""
+    _ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn, migrations=None):
+    """Apply every migration newer than the stored schema version
+
+    Each migration runs in its own transaction together with its
+    schema_version row, so a failed migration leaves no partial changes
+    and running this again is always safe.
+
+    Returns:
+        list: (version, name, seconds) for each migration applied
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    current = get_schema_version(conn)
+    applied = []
+
+    for version, name, steps in sorted(migrations, key=lambda m: m[0]):
+        if version <= current:
+            continue
+
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock
+            if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            duration = time.perf_counter() - started
+            conn.execute(
+                "INSERT INTO schema_version (version, name, duration_ms) VALUES (?, ?, ?)",
+                (version, name, duration * 1000)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, name, duration))
+
+    return applied
+
+
+def ensure_schema(conn):
+    """Bring a database up to date, creating the base schema only if needed
+
+    The base tables and sample data (database.init_db) are only created
+    when no migration has been recorded yet, i.e. for a new or
+    pre-migration database; otherwise this is a schema_version lookup plus
+    whatever migrations are pending.
+
+    Returns:
+        tuple: (whether the base schema was initialized, run_migrations result)
+
+    Raises:
+        RuntimeError: if the SQLite library is too old (see check_sqlite)
+    """
+    check_sqlite(conn)
+    initialized = get_schema_version(conn) == 0
+    if initialized:
+        from .init_db import initialize
+        initialize(conn)
+    return initialized, run_migrations(conn)
+
+
+if __name__ == '__main__':
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        total = time.perf_counter()
+        initialized, applied = ensure_schema(conn)
+        if initialized:
+            print("Created base schema")
+        for version, name, duration in applied:
+            print(f"Applied migration {version} ({name}) in {duration * 1000:.1f} ms")
+        print(f"Schema at version {get_schema_version(conn)} ({(time.perf_counter() - total) * 1000:.1f} ms)")
+    finally:
+        conn.close()
@@ -0,0 +1,267 @@
+import sqlite3
+import threading
+import time
+
+# PRAGMAs applied to every new connection, in this order.
+# WAL lets readers (get_puzzles, get_statistics) run while a submission is
+# being written; synchronous=NORMAL is durable across application crashes
+# in WAL mode and only risks the last commits on power loss.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,       # Milliseconds SQLite waits on a lock before SQLITE_BUSY
+    'cache_size': -16000,       # Negative = KiB, so 16 MB of page cache
+    'mmap_size': 268435456,     # 256 MB memory-mapped I/O
+    'temp_store': 'MEMORY',
+}
+
+# Default pool settings, overridable per pool through get_pool() on first use
+DEFAULT_POOL_SETTINGS = {
+    'max_size': 16,             # Maximum open connections (idle + checked out)
+    'checkout_timeout': 10.0,   # Seconds to wait for a free connection
+    'cached_statements': 256,   # Per-connection prepared statement cache
+    'health_check_after': 30.0, # Idle seconds after which a connection is pinged before reuse
+    'pragmas': DEFAULT_PRAGMAS,
+    'busy_retries': 3,          # Extra attempts when SQLITE_BUSY outlasts busy_timeout
+    'busy_retry_delay': 0.05,   # Seconds before the first retry, doubled each time
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within checkout_timeout"""
+
+
+def is_busy_error(error):
+    """True if a sqlite3 error means the database was locked by another connection"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_busy(func, *args, retries=3, delay=0.05, **kwargs):
+    """Call func, retrying with exponential backoff while SQLite reports busy"""
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if attempt == retries or not is_busy_error(e):
+                raise
+            time.sleep(delay * (2 ** attempt))
+
+
+def apply_pragmas(conn, pragmas):
+    """Apply PRAGMA settings to a connection"""
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}").fetchall()
+
+
+class RetryingCursor(sqlite3.Cursor):
+    """Cursor whose execute calls are retried on SQLITE_BUSY"""
+
+    def execute(self, *args):
+        conn = self.connection
+        return retry_on_busy(super().execute, *args, retries=conn.busy_retries, delay=conn.busy_retry_delay)
+
+    def executemany(self, *args):
+        conn = self.connection
+        return retry_on_busy(super().executemany, *args, retries=conn.busy_retries, delay=conn.busy_retry_delay)
+
+
+class TunedConnection(sqlite3.Connection):
+    """Connection that retries busy statements and commits
+
+    cursor() returns a RetryingCursor by default, so handler code written
+    against plain sqlite3 gets the retry behaviour unchanged.
+    """
+
+    busy_retries = 0
+    busy_retry_delay = 0.0
+
+    def cursor(self, factory=RetryingCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return retry_on_busy(super().execute, *args, retries=self.busy_retries, delay=self.busy_retry_delay)
+
+    def executemany(self, *args):
+        return retry_on_busy(super().executemany, *args, retries=self.busy_retries, delay=self.busy_retry_delay)
+
+    def commit(self):
+        return retry_on_busy(super().commit, retries=self.busy_retries, delay=self.busy_retry_delay)
+
+
+class PooledConnection:
+    """A checked-out connection that goes back to its pool on close()
+
+    Behaves like a sqlite3.Connection, so existing `conn.close()` calls
+    return the connection instead of tearing it down.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name in ('_pool', '_conn'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Handlers that return early without closing still give the connection back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Checkout/return pool of SQLite connections for one database file"""
+
+    def __init__(self, db_path, **settings):
+        self.db_path = db_path
+        self.settings = dict(DEFAULT_POOL_SETTINGS, **settings)
+        self.initializers = []
+        self._idle = []  # (connection, released_at), used LIFO to keep hot connections hot
+        self._size = 0
+        self._cond = threading.Condition()
+
+        # Metrics
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def add_initializer(self, func):
+        """Register func(conn), run once on every newly opened connection"""
+        self.initializers.append(func)
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.settings['pragmas'].get('busy_timeout', 5000) / 1000,
+            check_same_thread=False,
+            cached_statements=self.settings['cached_statements'],
+            factory=TunedConnection
+        )
+        conn.row_factory = sqlite3.Row
+        conn.busy_retries = self.settings['busy_retries']
+        conn.busy_retry_delay = self.settings['busy_retry_delay']
+        apply_pragmas(conn, self.settings['pragmas'])
+        for initializer in self.initializers:
+            initializer(conn)
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def connection(self):
+        """Check out a connection, opening one if the pool is below max_size"""
+        deadline = time.monotonic() + self.settings['checkout_timeout']
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.settings['max_size']:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection available after {self.settings['checkout_timeout']}s")
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                else:
+                    conn, released_at = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    self._discard(None)
+                    raise
+                self.created += 1
+                return PooledConnection(self, conn)
+
+            if time.monotonic() - released_at < self.settings['health_check_after'] or self._is_healthy(conn):
+                self.reused += 1
+                return PooledConnection(self, conn)
+
+            # Stale or broken connection: drop it and try again
+            self._discard(conn)
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            self.discarded += 1
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Close idle connections (checked-out ones are closed when returned)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.settings['max_size'],
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, **settings):
+    """Return the shared pool for db_path, creating it on first use"""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path, **settings)
+        return pool
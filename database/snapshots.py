@@ -0,0 +1,63 @@
+import time
+from .job_state import get_watermark, set_watermark
+
+# Incremental maintenance of historical_rankings.
+#
+# A record's rank can only change when a new solve of the same puzzle is
+# recorded, so each run only looks at puzzles that received solves since
+# the previous run (tracked by a puzzle_records id watermark in
+# job_state), and only writes a snapshot row for records whose rank
+# differs from their latest snapshot.
+
+SNAPSHOT_JOB = 'historical_rankings'
+
+
+def snapshot_historical_rankings(conn):
+    """Record changed ranks of puzzles solved since the last run
+
+    Returns:
+        int: number of snapshot rows written
+    """
+    last_id = get_watermark(conn, SNAPSHOT_JOB)
+    max_id = conn.execute("SELECT MAX(id) FROM puzzle_records").fetchone()[0]
+    if max_id is None or max_id <= last_id:
+        return 0
+
+    cursor = conn.execute(
+        """
+        INSERT INTO historical_rankings (user_id, puzzle_id, score, rank, timestamp, record_id)
+        SELECT r.username, r.puzzle_id, r.time_taken, r.rank, datetime('now'), r.id
+        FROM (
+            SELECT id, username, puzzle_id, time_taken,
+                   RANK() OVER (PARTITION BY puzzle_id ORDER BY time_taken) AS rank
+            FROM puzzle_records
+            WHERE puzzle_id IN (
+                SELECT DISTINCT puzzle_id FROM puzzle_records WHERE id > ? AND id <= ?
+            )
+            AND id <= ?
+        ) r
+        WHERE r.rank IS NOT (
+            SELECT h.rank FROM historical_rankings h
+            WHERE h.record_id = r.id
+            ORDER BY h.id DESC
+            LIMIT 1
+        )
+        """,
+        (last_id, max_id, max_id)
+    )
+    written = cursor.rowcount
+    set_watermark(conn, SNAPSHOT_JOB, max_id)
+    conn.commit()
+    return written
+
+
+if __name__ == '__main__':
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        started = time.perf_counter()
+        written = snapshot_historical_rankings(conn)
+        print(f"Wrote {written} historical ranking snapshot(s) in {(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        conn.close()
@@ -0,0 +1,54 @@
+from .user_stats import record_solves
+
+# Writes of correct solutions. A solve is (username, puzzle_id,
+# time_taken, rank): time_taken is None for untimed solves, and rank is the
+# rank the solver was told, recorded as the first historical_rankings
+# snapshot of the new puzzle_records row.
+
+
+def write_solves(conn, solves):
+    """Record a batch of correct solves; caller commits
+
+    Counter updates are folded per user and per puzzle, so a batch costs
+    one UPDATE per distinct user and puzzle plus two INSERTs per timed
+    solve, all in the caller's transaction.
+
+    Returns:
+        int: number of puzzle_records rows written
+    """
+    solved_by_user = {}
+    solved_by_puzzle = {}
+    for username, puzzle_id, _, _ in solves:
+        solved_by_user[username] = solved_by_user.get(username, 0) + 1
+        solved_by_puzzle[puzzle_id] = solved_by_puzzle.get(puzzle_id, 0) + 1
+
+    conn.executemany(
+        "UPDATE users SET puzzles_solved = puzzles_solved + ? WHERE username = ?",
+        [(count, username) for username, count in solved_by_user.items()]
+    )
+    conn.executemany(
+        "UPDATE puzzles SET times_solved = times_solved + ? WHERE id = ?",
+        [(count, puzzle_id) for puzzle_id, count in solved_by_puzzle.items()]
+    )
+
+    # Each snapshot references its record, so records are inserted one by one
+    snapshots = []
+    for username, puzzle_id, time_taken, rank in solves:
+        if time_taken is None:
+            continue
+        record_id = conn.execute(
+            "INSERT INTO puzzle_records (username, puzzle_id, time_taken) VALUES (?, ?, ?)",
+            (username, puzzle_id, time_taken)
+        ).lastrowid
+        snapshots.append((username, puzzle_id, time_taken, rank, record_id))
+    conn.executemany(
+        """
+        INSERT INTO historical_rankings
+        (user_id, puzzle_id, score, rank, timestamp, record_id)
+        VALUES (?, ?, ?, ?, datetime('now'), ?)
+        """,
+        snapshots
+    )
+
+    record_solves(conn, [(username, time_taken) for username, _, time_taken, _ in solves])
+    return len(snapshots)
@@ -0,0 +1,209 @@
+import time
+
+# Materialized per-user statistics, one row per registered user. Every
+# column is derived from users and puzzle_records. Rows are created and the
+# puzzles_solved / puzzles_created counters copied by triggers on users,
+# whatever path writes them; solve times are added by the solve write path
+# inside its transaction, so statistics are read from this single table
+# instead of aggregating puzzle_records on every request.
+# rebuild_user_stats recomputes it from scratch.
+
+CREATE_USER_STATS_TABLE = '''
+CREATE TABLE IF NOT EXISTS user_stats (
+    username TEXT PRIMARY KEY,
+    puzzles_solved INTEGER NOT NULL DEFAULT 0,
+    puzzles_created INTEGER NOT NULL DEFAULT 0,
+    fastest_time REAL,
+    time_sum REAL NOT NULL DEFAULT 0,
+    time_count INTEGER NOT NULL DEFAULT 0,
+    latest_time REAL
+)
+'''
+
+# Listing order with username as tie-breaker, so every row has a unique
+# position and pages can be fetched by keyset instead of OFFSET
+CREATE_USER_STATS_ORDER_INDEX = '''
+CREATE INDEX IF NOT EXISTS idx_user_stats_order
+ON user_stats (puzzles_solved DESC, puzzles_created DESC, username)
+'''
+
+# Statistics row of every new user. Solve times recorded under the name
+# before it was registered are picked up, as the full aggregation always did.
+CREATE_USER_STATS_TRIGGER = '''
+CREATE TRIGGER IF NOT EXISTS trg_users_user_stats
+AFTER INSERT ON users
+BEGIN
+    INSERT OR IGNORE INTO user_stats (username, fastest_time, time_sum, time_count, latest_time)
+    SELECT NEW.username, MIN(time_taken), COALESCE(SUM(time_taken), 0), COUNT(time_taken),
+           (SELECT time_taken FROM puzzle_records
+            WHERE username = NEW.username
+            ORDER BY solved_at DESC, id DESC
+            LIMIT 1)
+    FROM puzzle_records
+    WHERE username = NEW.username;
+END
+'''
+
+# Counters follow users, which every solve and new puzzle path updates
+CREATE_USER_STATS_COUNTERS_TRIGGER = '''
+CREATE TRIGGER IF NOT EXISTS trg_users_user_stats_counters
+AFTER UPDATE OF puzzles_solved, puzzles_created ON users
+BEGIN
+    UPDATE user_stats
+    SET puzzles_solved = COALESCE(NEW.puzzles_solved, 0),
+        puzzles_created = COALESCE(NEW.puzzles_created, 0)
+    WHERE username = NEW.username;
+END
+'''
+
+STATS_COLUMNS = "username, puzzles_solved, puzzles_created, fastest_time, time_sum, time_count"
+STATS_ORDER = "puzzles_solved DESC, puzzles_created DESC, username"
+STATS_ORDER_REVERSED = "puzzles_solved, puzzles_created, username DESC"
+
+# Rows after / before the position (:solved, :created, :username)
+AFTER_KEY = '''
+    puzzles_solved < :solved
+    OR (puzzles_solved = :solved AND (
+        puzzles_created < :created
+        OR (puzzles_created = :created AND username > :username)))
+'''
+BEFORE_KEY = '''
+    puzzles_solved > :solved
+    OR (puzzles_solved = :solved AND (
+        puzzles_created > :created
+        OR (puzzles_created = :created AND username < :username)))
+'''
+
+
+def record_solves(conn, solves):
+    """Account the times of correct solves given as (username, time_taken or None); caller commits
+
+    The solve count follows users.puzzles_solved (see
+    CREATE_USER_STATS_COUNTERS_TRIGGER). Times are folded into one UPDATE
+    per user; the latest time is the last timed solve in the given order.
+    """
+    totals = {}
+    for username, time_taken in solves:
+        if time_taken is None:
+            continue
+        user = totals.setdefault(username, {
+            'username': username, 'fastest': None, 'time_sum': 0, 'time_count': 0, 'latest': None
+        })
+        if user['fastest'] is None or time_taken < user['fastest']:
+            user['fastest'] = time_taken
+        user['time_sum'] += time_taken
+        user['time_count'] += 1
+        user['latest'] = time_taken
+    conn.executemany(
+        """
+        UPDATE user_stats SET
+            fastest_time = CASE
+                WHEN :fastest IS NULL THEN fastest_time
+                WHEN fastest_time IS NULL OR :fastest < fastest_time THEN :fastest
+                ELSE fastest_time
+            END,
+            time_sum = time_sum + :time_sum,
+            time_count = time_count + :time_count,
+            latest_time = COALESCE(:latest, latest_time)
+        WHERE username = :username
+        """,
+        list(totals.values())
+    )
+
+
+def stats_key(row):
+    """Keyset cursor of a listing row: [puzzles_solved, puzzles_created, username]"""
+    return [row[1], row[2], row[0]]
+
+
+def _key_params(key):
+    solved, created, username = key
+    return {'solved': solved, 'created': created, 'username': username}
+
+
+def get_stats_page(conn, limit, after=None):
+    """Up to limit listing rows following the keyset cursor `after` (from the top if None)"""
+    if after is None:
+        return conn.execute(
+            f"SELECT {STATS_COLUMNS} FROM user_stats ORDER BY {STATS_ORDER} LIMIT ?",
+            (limit,)
+        ).fetchall()
+    params = _key_params(after)
+    params['limit'] = limit
+    return conn.execute(
+        f"SELECT {STATS_COLUMNS} FROM user_stats WHERE {AFTER_KEY} ORDER BY {STATS_ORDER} LIMIT :limit",
+        params
+    ).fetchall()
+
+
+def get_stats_neighborhood(conn, username, radius):
+    """A user's listing rank and the rows within radius positions of it
+
+    Returns:
+        tuple: (rank, [(rank, row), ...]), or (None, []) for unknown users
+    """
+    row = conn.execute(f"SELECT {STATS_COLUMNS} FROM user_stats WHERE username = ?", (username,)).fetchone()
+    if row is None:
+        return None, []
+    params = _key_params(stats_key(row))
+    ahead = conn.execute(f"SELECT COUNT(*) FROM user_stats WHERE {BEFORE_KEY}", params).fetchone()[0]
+    rank = ahead + 1
+    if radius == 0:
+        return rank, [(rank, row)]
+
+    params['limit'] = radius
+    before = conn.execute(
+        f"SELECT {STATS_COLUMNS} FROM user_stats WHERE {BEFORE_KEY} ORDER BY {STATS_ORDER_REVERSED} LIMIT :limit",
+        params
+    ).fetchall()
+    after = get_stats_page(conn, radius, stats_key(row))
+
+    rows = before[::-1] + [row] + after
+    first = rank - len(before)
+    return rank, [(first + i, r) for i, r in enumerate(rows)]
+
+
+def rebuild_user_stats(conn):
+    """Recompute every row from users and puzzle_records; caller commits
+
+    Returns:
+        int: number of users
+    """
+    conn.execute("DELETE FROM user_stats")
+    cursor = conn.execute(
+        """
+        INSERT INTO user_stats
+            (username, puzzles_solved, puzzles_created, fastest_time, time_sum, time_count, latest_time)
+        SELECT u.username, COALESCE(u.puzzles_solved, 0), COALESCE(u.puzzles_created, 0),
+               r.fastest_time, COALESCE(r.time_sum, 0), COALESCE(r.time_count, 0),
+               (SELECT time_taken FROM puzzle_records
+                WHERE username = u.username
+                ORDER BY solved_at DESC, id DESC
+                LIMIT 1)
+        FROM users u
+        LEFT JOIN (
+            SELECT username, MIN(time_taken) AS fastest_time,
+                   SUM(time_taken) AS time_sum, COUNT(time_taken) AS time_count
+            FROM puzzle_records
+            GROUP BY username
+        ) r ON r.username = u.username
+        """
+    )
+    return cursor.rowcount
+
+
+if __name__ == '__main__':
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        started = time.perf_counter()
+        conn.execute(CREATE_USER_STATS_TABLE)
+        conn.execute(CREATE_USER_STATS_ORDER_INDEX)
+        conn.execute(CREATE_USER_STATS_TRIGGER)
+        conn.execute(CREATE_USER_STATS_COUNTERS_TRIGGER)
+        users = rebuild_user_stats(conn)
+        conn.commit()
+        print(f"Rebuilt statistics for {users} user(s) in {(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        conn.close()
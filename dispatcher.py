@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+
+# Schema field kinds. A schema maps request field names to a kind:
+#   str, int, ...  the value must be an instance of that type (or tuple of types)
+#   JSON           the value may be JSON text or an already-decoded value;
+#                  handlers always receive the decoded value
+#   Optional(kind) the field may be missing or null
+JSON = 'json'
+
+
+class Optional:
+    def __init__(self, kind):
+        self.kind = kind
+
+
+class SchemaError(Exception):
+    """Raised when a request does not match its action's schema"""
+
+
+class UnknownAction(Exception):
+    """Raised when no handler is registered for an action"""
+
+
+def action(name, schema=None):
+    """Mark a handler method as serving `name`, with an optional request schema"""
+    def decorator(func):
+        func.action_name = name
+        func.action_schema = schema
+        return func
+    return decorator
+
+
+def _decode_json(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            # Plain text is kept as a JSON string value
+            return value
+    return value
+
+
+def validate(schema, request):
+    """Check a request against a schema, decoding JSON fields in place"""
+    for field, kind in schema.items():
+        optional = isinstance(kind, Optional)
+        if optional:
+            kind = kind.kind
+        value = request.get(field)
+        if value is None:
+            if optional:
+                continue
+            raise SchemaError(f"Missing required field '{field}'")
+        if kind == JSON:
+            request[field] = _decode_json(value)
+        elif not isinstance(value, kind) or (isinstance(value, bool) and kind is not bool):
+            kinds = kind if isinstance(kind, tuple) else (kind,)
+            raise SchemaError(f"Field '{field}' must be of type {' or '.join(k.__name__ for k in kinds)}")
+
+
+class Dispatcher:
+    """Maps action names to handlers and runs them through a middleware chain
+
+    A middleware is a callable middleware(action, request, call_next) that
+    returns a response, usually by calling call_next(request). Middleware
+    runs in the order it was added, outermost first.
+    """
+
+    def __init__(self):
+        self.routes = {}  # action -> (handler, schema)
+        self.middleware = []
+        self._chain = {}
+
+    def register(self, name, handler, schema=None):
+        self.routes[name] = (handler, schema)
+        self._chain.clear()
+
+    def register_handlers(self, obj):
+        """Register every method of obj decorated with @action"""
+        for attr in dir(type(obj)):
+            func = getattr(type(obj), attr)
+            name = getattr(func, 'action_name', None)
+            if name is not None:
+                self.register(name, getattr(obj, attr), func.action_schema)
+
+    def use(self, middleware):
+        self.middleware.append(middleware)
+        self._chain.clear()
+
+    def _build_chain(self, name):
+        handler, schema = self.routes[name]
+
+        def call_handler(request):
+            if schema:
+                try:
+                    validate(schema, request)
+                except SchemaError as e:
+                    return {'status': 'error', 'message': str(e)}
+            return handler(request)
+
+        call = call_handler
+        for middleware in reversed(self.middleware):
+            call = (lambda mw, call_next: lambda request: mw(name, request, call_next))(middleware, call)
+        return call
+
+    def dispatch(self, request):
+        name = request.get('action')
+        chain = self._chain.get(name)
+        if chain is None:
+            if name not in self.routes:
+                raise UnknownAction(name)
+            chain = self._chain[name] = self._build_chain(name)
+        return chain(request)
+
+
+class ActionTimer:
+    """Middleware recording call counts, errors and latency per action"""
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, name, request, call_next):
+        started = time.perf_counter()
+        error = False
+        try:
+            response = call_next(request)
+            error = isinstance(response, dict) and response.get('status') != 'ok'
+            return response
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                stats = self.stats.get(name)
+                if stats is None:
+                    stats = self.stats[name] = {'calls': 0, 'errors': 0, 'total': 0.0, 'max': 0.0}
+                stats['calls'] += 1
+                stats['errors'] += error
+                stats['total'] += elapsed
+                stats['max'] = max(stats['max'], elapsed)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                name: {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(stats['total'] / stats['calls'] * 1000, 3),
+                    'max_ms': round(stats['max'] * 1000, 3)
+                }
+                for name, stats in self.stats.items()
+            }
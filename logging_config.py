@@ -0,0 +1,58 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+
+LOG_FORMAT = '%(asctime)s %(levelname)-7s [%(threadName)s] %(name)s: %(message)s'
+
+# Fraction of request/response body records that are actually logged
+DEFAULT_BODY_SAMPLE_RATE = 0.01
+
+
+class BodySampler(logging.Filter):
+    """Pass only a sample of records logged with extra={'body': True}
+
+    Full request and response bodies are large and frequent; sampling
+    them keeps DEBUG logging usable under load. Rejected records are
+    dropped before their message is ever formatted.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'body', False):
+            return self.rate >= 1 or random.random() < self.rate
+        return True
+
+
+def setup_logging(level='INFO', body_sample_rate=DEFAULT_BODY_SAMPLE_RATE, stream=None):
+    """Route 'crossword' loggers through a queue to a background writer thread
+
+    The calling thread still merges each message with its arguments (and
+    renders any traceback) when QueueHandler prepares the record; applying
+    LOG_FORMAT and writing the line happen on the listener thread, so slow
+    stdout never blocks a request handler.
+
+    Returns:
+        QueueListener: already started, stopped automatically at exit
+    """
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(BodySampler(body_sample_rate))
+
+    logger = logging.getLogger('crossword')
+    logger.setLevel(level)
+    logger.handlers[:] = [queue_handler]
+    logger.propagate = False
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import struct
+
+# Framing protocol shared by server.py and client.py.
+#
+# Every framed message is a 5-byte header followed by a UTF-8 JSON payload:
+#   - 1 byte:  protocol version
+#   - 4 bytes: payload length (unsigned, big-endian)
+#
+# Connections start in legacy mode (bare JSON, no header) so that old clients
+# keep working. A new client sends a legacy {'action': 'hello'} request with
+# the highest version it supports; a new server answers with the version it
+# picked and both sides switch to framed messages from then on. An old server
+# answers 'Unknown action type' and the client simply stays in legacy mode.
+#
+# Several requests can share one round trip:
+#   - {'action': 'batch', 'requests': [...]} runs up to MAX_BATCH_SIZE
+#     sub-requests and answers {'status': 'ok', 'responses': [...]} in the
+#     same order.
+#   - On framed connections, a request carrying a CORRELATION_KEY is
+#     pipelined: the server reads on without waiting for it, and its
+#     response (echoing the key) may arrive before those of earlier
+#     requests. Requests without the key are answered in order.
+
+PROTOCOL_VERSION = 1
+SUPPORTED_VERSIONS = (1,)
+HELLO_ACTION = 'hello'
+BATCH_ACTION = 'batch'
+CORRELATION_KEY = 'request_id'
+MAX_BATCH_SIZE = 64
+
+HEADER = struct.Struct('!BI')
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # 16 MB
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends a malformed or unsupported frame"""
+
+
+def negotiate_version(requested):
+    """Pick the highest supported protocol version not above the requested one"""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return None
+    candidates = [v for v in SUPPORTED_VERSIONS if v <= requested]
+    return max(candidates) if candidates else None
+
+
+def encode_payload(message):
+    """Serialize a message dict to JSON bytes"""
+    return json.dumps(message).encode()
+
+
+def encode_frame(payload, version=PROTOCOL_VERSION):
+    """Prefix already-encoded payload bytes with a frame header"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f'Frame too large: {len(payload)} bytes')
+    return HEADER.pack(version, len(payload)) + payload
+
+
+def encode_message(message, version=PROTOCOL_VERSION):
+    """Serialize a message dict into a complete frame"""
+    return encode_frame(encode_payload(message), version)
+
+
+def decode_header(header):
+    """Return the payload length from a frame header, validating it"""
+    version, length = HEADER.unpack(header)
+    if version not in SUPPORTED_VERSIONS:
+        raise ProtocolError(f'Unsupported protocol version: {version}')
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f'Frame too large: {length} bytes')
+    return length
+
+
+def decode_payload(payload):
+    """Parse a frame payload exactly once"""
+    try:
+        return json.loads(payload)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ProtocolError(f'Invalid JSON payload: {str(e)}')
+
+
+def recv_exactly(sock, size):
+    """Read exactly `size` bytes from a socket, or None if the peer closed"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            return None
+        received += n
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    """Receive a single framed message, or None if the connection closed"""
+    header = recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    length = decode_header(header)
+    payload = recv_exactly(sock, length) if length else b''
+    if payload is None:
+        return None
+    return decode_payload(payload)
+
+
+def send_message(sock, message, version=PROTOCOL_VERSION):
+    """Send a single framed message"""
+    sock.sendall(encode_message(message, version))
+
+
+class LegacyDecoder:
+    """Incremental decoder for bare JSON messages (pre-framing protocol)
+
+    Chunks are collected until they form a complete JSON document. The
+    buffer is only parsed when it could possibly be complete (it ends
+    with a closing brace), which avoids re-parsing on every chunk.
+    Payloads that cannot become a request (not an object, or more than
+    MAX_FRAME_SIZE bytes) are rejected instead of buffered.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        """Add received bytes; return the message once complete, else None"""
+        self.buffer += chunk
+        start = self.buffer.lstrip()[:1]
+        if start and start != b'{':
+            # Never ends like a request would, so report the parse error now
+            try:
+                json.loads(self.buffer.decode())
+                error = 'expected a JSON object'
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                error = str(e)
+            self.buffer = bytearray()
+            raise ProtocolError(f'Invalid JSON format: {error}')
+        if len(self.buffer) > MAX_FRAME_SIZE:
+            self.buffer = bytearray()
+            raise ProtocolError(f'Message too large: more than {MAX_FRAME_SIZE} bytes')
+        if not self.buffer.rstrip().endswith(b'}'):
+            return None
+        try:
+            text = self.buffer.decode()
+            message = json.loads(text)
+        except UnicodeDecodeError as e:
+            self.buffer = bytearray()
+            raise ProtocolError(f'Invalid JSON format: {str(e)}')
+        except json.JSONDecodeError as e:
+            if 'Unterminated string' in e.msg or e.pos >= len(text.rstrip()):
+                # Message is still incomplete, keep receiving
+                return None
+            self.buffer = bytearray()
+            raise ProtocolError(f'Invalid JSON format: {str(e)}')
+        self.buffer = bytearray()
+        return message
+
+
+def recv_legacy_message(sock, buffer_size=4096):
+    """Receive a bare JSON message, or None if the connection closed"""
+    decoder = LegacyDecoder()
+    while True:
+        chunk = sock.recv(buffer_size)
+        if not chunk:
+            return None
+        message = decoder.feed(chunk)
+        if message is not None:
+            return message
+
+
+async def read_message(reader):
+    """Receive a single framed message from an asyncio StreamReader"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+        length = decode_header(header)
+        payload = await reader.readexactly(length) if length else b''
+    except asyncio.IncompleteReadError:
+        return None
+    return decode_payload(payload)
+
+
+async def read_legacy_message(reader, buffer_size=4096):
+    """Receive a bare JSON message from an asyncio StreamReader"""
+    decoder = LegacyDecoder()
+    while True:
+        chunk = await reader.read(buffer_size)
+        if not chunk:
+            return None
+        message = decoder.feed(chunk)
+        if message is not None:
+            return message
@@ -0,0 +1,206 @@
+import logging
+import queue
+import socket
+import threading
+
+import protocol
+
+logger = logging.getLogger('crossword.pubsub')
+
+# Event frames a blocking connection may have unsent before it is dropped
+EVENT_OUTBOX_SIZE = 100
+# Bytes an asyncio connection may have unsent before it is dropped
+EVENT_OUTBOX_BYTES = 1024 * 1024
+
+
+class SocketOutbox:
+    """Frames for one blocking socket, sent by a thread of their own
+
+    Carries event frames and the connection's pipelined responses, so
+    neither the publishing handler nor the worker that computed a response
+    ever blocks on the socket. Frames are sent holding the connection's
+    send lock so they never interleave with inline responses. At most
+    `size` event frames may be unsent: a connection that stops reading
+    fills its outbox and is shut down. Responses are never refused; the
+    connection bounds them by how many requests it lets run at once.
+    """
+
+    def __init__(self, sock, send_lock, size=EVENT_OUTBOX_SIZE):
+        self._sock = sock
+        self._send_lock = send_lock
+        self._size = size
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._events = 0  # Event frames queued and not sent yet
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        """Start the sender thread, once the connection needs it"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='socket-sender', daemon=True)
+                self._thread.start()
+
+    def offer(self, frame):
+        """Queue an event frame without blocking; False if the outbox is full or closed"""
+        with self._lock:
+            if self._closed or self._events >= self._size:
+                return False
+            self._events += 1
+        self._queue.put((frame, self._event_sent))
+        return True
+
+    def _event_sent(self):
+        with self._lock:
+            self._events -= 1
+
+    def put(self, frame, on_sent):
+        """Queue a response frame; on_sent() is called once it is written or dropped"""
+        self._queue.put((frame, on_sent))
+
+    def _run(self):
+        failed = False
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, on_sent = item
+            try:
+                if not failed:
+                    with self._send_lock:
+                        self._sock.sendall(frame)
+            except OSError as e:
+                # Later frames are only acknowledged, so their senders are not left waiting
+                logger.debug("Send failed: %s", e)
+                failed = True
+                self.close()
+            finally:
+                on_sent()
+
+    def close(self):
+        """Drop the connection; a blocked send or receive on it returns"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def stop(self):
+        """Let the sender thread exit once what is queued has been sent"""
+        with self._lock:
+            self._closed = True
+        self._queue.put(None)
+
+
+class StreamOutbox:
+    """Event frames for an asyncio stream, written by its event loop
+
+    The transport buffers what the peer has not read yet; once that passes
+    limit bytes the connection is dropped.
+    """
+
+    def __init__(self, loop, writer, limit=EVENT_OUTBOX_BYTES):
+        self._loop = loop
+        self._writer = writer
+        self._limit = limit
+        self._closed = False
+
+    def offer(self, frame):
+        """Hand a frame to the event loop; False if too much is unsent or the stream is closed"""
+        if self._closed or self._writer.transport.get_write_buffer_size() > self._limit:
+            return False
+        self._loop.call_soon_threadsafe(self._write, frame)
+        return True
+
+    def _write(self, frame):
+        if not self._writer.is_closing():
+            self._writer.write(frame)
+
+    def close(self):
+        """Drop the connection, discarding what it has not read"""
+        if self._closed:
+            return
+        self._closed = True
+        self._loop.call_soon_threadsafe(self._writer.transport.abort)
+
+
+class Subscription:
+    """One connection's interest in events addressed to a user"""
+
+    def __init__(self, hub, user_id, outbox):
+        self.hub = hub
+        self.user_id = user_id
+        self.outbox = outbox
+
+    def cancel(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """In-process publish/subscribe of events addressed to users
+
+    Connections subscribe with their outbox (SocketOutbox or StreamOutbox).
+    publish() encodes an event frame once and offers it to each subscribed
+    outbox without blocking, so handlers and other subscribers never wait
+    on a slow one; a subscriber whose outbox is full is dropped.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id, outbox):
+        subscription = Subscription(self, user_id, outbox)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event, data):
+        """Send an event frame to every connection subscribed for user_id
+
+        Returns:
+            int: number of subscriptions the event was queued for
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+            self.published += 1
+        if not subscribers:
+            return 0
+        frame = protocol.encode_message({'event': event, 'data': data})
+        delivered = 0
+        for subscription in subscribers:
+            if subscription.outbox.offer(frame):
+                delivered += 1
+            else:
+                logger.warning("Dropping slow subscriber of %s", subscription.user_id)
+                subscription.cancel()
+                subscription.outbox.close()
+        with self._lock:
+            self.delivered += delivered
+            self.dropped += len(subscribers) - delivered
+        return delivered
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'subscriptions': sum(len(s) for s in self._subscribers.values()),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped
+            }
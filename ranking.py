@@ -0,0 +1,75 @@
+import bisect
+import threading
+
+
+class RankingIndex:
+    """Per-puzzle sorted solve times answering rank queries in O(log n)
+
+    The database (puzzle_records) stays the source of truth: a puzzle's
+    times are loaded from it the first time the puzzle is queried (or in
+    bulk with load_all). Solves are add()ed when they are accepted, which
+    with a write-behind solve writer is before they are committed; a
+    solve that is then not written is taken out again with remove().
+
+    Args:
+        loader: callable(puzzle_id) -> iterable of solve times, used for
+            puzzles not loaded yet
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._times = {}  # puzzle_id -> sorted list of times
+        self._lock = threading.Lock()
+
+    def _get(self, puzzle_id):
+        times = self._times.get(puzzle_id)
+        if times is None:
+            times = sorted(t for t in self.loader(puzzle_id) if t is not None)
+            self._times[puzzle_id] = times
+        return times
+
+    def load_all(self, rows):
+        """Load every puzzle from (puzzle_id, time) rows
+
+        Puzzles already loaded (on demand, while rows were being read) are
+        kept: they are at least as current as the rows, and may include
+        solves added since.
+        """
+        loaded = {}
+        for puzzle_id, time_taken in rows:
+            if time_taken is not None:
+                loaded.setdefault(puzzle_id, []).append(time_taken)
+        for times in loaded.values():
+            times.sort()
+        with self._lock:
+            loaded.update(self._times)
+            self._times = loaded
+
+    def rank_and_total(self, puzzle_id, time_taken):
+        """1 + number of recorded times strictly faster than time_taken, and the number of times"""
+        with self._lock:
+            times = self._get(puzzle_id)
+            return bisect.bisect_left(times, time_taken) + 1, len(times)
+
+    def add(self, puzzle_id, time_taken):
+        """Record an accepted solve time"""
+        with self._lock:
+            bisect.insort(self._get(puzzle_id), time_taken)
+
+    def remove(self, puzzle_id, time_taken):
+        """Take out one occurrence of a solve time that was not written"""
+        with self._lock:
+            times = self._times.get(puzzle_id)
+            if times is None:
+                # Not loaded: the database never had it
+                return
+            i = bisect.bisect_left(times, time_taken)
+            if i < len(times) and times[i] == time_taken:
+                del times[i]
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'puzzles': len(self._times),
+                'entries': sum(len(times) for times in self._times.values())
+            }
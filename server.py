@@ -1,248 +1,855 @@
+import argparse
+import asyncio
 import socket
 import threading
 import json
 import sqlite3
-import traceback
-from database import init_db, get_db_connection
+import logging
+import time
+from concurrent import futures
+from concurrent.futures import Future, ThreadPoolExecutor
+import protocol
+from worker_pool import WorkerPool, ServerBusy, completed, gather
+from cache import LRUCache
+from ranking import RankingIndex
+from social_graph import SocialGraph, SENT, RECEIVED
+from pubsub import EventHub, SocketOutbox, StreamOutbox
+from solve_writer import SolveWriter, DEFAULT_SOLVE_WRITER_CONFIG, DURABILITY_MODES
+from dispatcher import Dispatcher, ActionTimer, UnknownAction, action, JSON, Optional
+from logging_config import setup_logging, DEFAULT_BODY_SAMPLE_RATE
+from database import get_db_connection, get_pool, DB_PATH
+from database.migrations import ensure_schema, get_schema_version
+from database.snapshots import snapshot_historical_rankings
+from database.user_stats import get_stats_page, get_stats_neighborhood, stats_key
+from database.job_state import get_watermark, set_watermark
+from database.solves import write_solves
+from database.friendships import (
+    insert_request, confirm_request, delete_request, load_user_id, load_relationships
+)
+from database.geometry import (
+    compute_clue_geometry, apply_clue_geometry, store_clue_geometry,
+    insert_clue_geometry, load_clue_geometry
+)
+
+logger = logging.getLogger('crossword.server')
+
+# Worker pool sizing per action class: 'workers' caps concurrent handlers,
+# 'queue_size' caps requests waiting for a worker before 'server busy' is returned
+DEFAULT_POOL_CONFIG = {
+    'auth': {'workers': 2, 'queue_size': 128},
+    'read': {'workers': 4, 'queue_size': 256},
+    'write': {'workers': 2, 'queue_size': 256},
+    'social': {'workers': 2, 'queue_size': 128},
+    'stats': {'workers': 1, 'queue_size': 32},
+}
+
+# Action -> action class. Heavy aggregate queries get their own class so a
+# spike of them cannot starve submissions.
+ACTION_CLASSES = {
+    'login': 'auth',
+    'register': 'auth',
+    'get_puzzles': 'read',
+    'get_puzzle_detail': 'read',
+    'submit_solution': 'write',
+    'add_puzzle': 'write',
+    'get_statistics': 'stats',
+    'get_historical_rankings': 'stats',
+    'add_friend': 'social',
+    'confirm_friend': 'social',
+    'reject_friend': 'social',
+    'send_message': 'social',
+    'get_messages': 'social',
+    'get_inbox': 'social',
+    'get_friend_requests': 'social',
+    'get_friends': 'social',
+}
+
+# Bounds for the parsed puzzle detail cache
+PUZZLE_CACHE_CONFIG = {
+    'max_entries': 1024,
+    'max_bytes': 32 * 1024 * 1024,
+}
+
+# Bounds for the cache of already-serialized responses
+RESPONSE_CACHE_CONFIG = {
+    'max_entries': 2048,
+    'max_bytes': 64 * 1024 * 1024,
+}
+
+# Read-only actions whose successful responses are cached as encoded bytes,
+# mapped to a function returning the cache key for a request
+CACHEABLE_ACTIONS = {
+    'get_puzzles': lambda request: None,
+    'get_puzzle_detail': lambda request: _puzzle_key(request.get('puzzle_id')),
+}
+
+# Warm-up run on a background thread after startup: the cached puzzle
+# list, the details of the `top_puzzles` most solved puzzles and the full
+# ranking index. Readiness is reported once it has finished.
+DEFAULT_WARMUP_CONFIG = {
+    'enabled': True,
+    'top_puzzles': 20,
+}
+
+# Connection-level actions managing server-push event subscriptions
+SUBSCRIPTION_ACTIONS = ('subscribe', 'unsubscribe')
+# Events pushed to subscribers, as {'event': name, 'data': {...}} frames
+EVENT_TYPES = ('message', 'friend_request', 'friend_confirmed')
+
+# Messages per conversation returned by get_inbox
+INBOX_MESSAGES = 20
+INBOX_MAX_MESSAGES = 200
+
+# Message history page sizes for get_messages
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+# get_messages cursors; at most one may be given
+MESSAGE_CURSORS = ('before', 'after', 'since')
+
+# One page of a conversation, read from both directions of the
+# (sender_id, receiver_id, id) index and merged by id. The index is named:
+# without ANALYZE statistics SQLite prefers the rowid range of a cursor
+# condition, which scans every later message and sorts
+CONVERSATION_PAGE_QUERY = '''
+    SELECT id, sender_id, receiver_id, message, timestamp FROM (
+        SELECT id, sender_id, receiver_id, message, timestamp
+        FROM messages INDEXED BY idx_messages_sender_receiver_id
+        WHERE sender_id = :user AND receiver_id = :friend AND {condition}
+        ORDER BY id {direction} LIMIT :limit
+    )
+    UNION ALL
+    SELECT id, sender_id, receiver_id, message, timestamp FROM (
+        SELECT id, sender_id, receiver_id, message, timestamp
+        FROM messages INDEXED BY idx_messages_sender_receiver_id
+        WHERE sender_id = :friend AND receiver_id = :user AND {condition}
+        ORDER BY id {direction} LIMIT :limit
+    )
+    ORDER BY id {direction} LIMIT :limit
+'''
+
+# Seconds a closing connection waits for its pipelined requests to be answered
+PIPELINE_DRAIN_TIMEOUT = 30
+# Pipelined requests a threaded connection runs at once; further ones are
+# read once earlier responses have been written
+PIPELINE_MAX_IN_FLIGHT = 64
+
+# job_state watermark of the crosswords -> puzzles startup sync
+CROSSWORD_SYNC_JOB = 'crossword_sync'
+
+# Leaderboard page sizes for get_statistics
+STATS_PAGE_SIZE = 50
+STATS_MAX_PAGE_SIZE = 200
+# Users shown on either side of the caller in 'top' mode
+STATS_NEIGHBORHOOD = 5
+
+def _puzzle_key(puzzle_id):
+    """Normalize a puzzle id from a request so '3' and 3 share cache entries"""
+    try:
+        return int(puzzle_id)
+    except (TypeError, ValueError):
+        return puzzle_id
+
+def _with_correlation_id(response, request_id):
+    """Echo a pipelined request's correlation id in its response"""
+    if isinstance(response, bytes):
+        # Already-encoded JSON object from the response cache
+        return b'%s, %s: %s}' % (
+            response[:-1], protocol.encode_payload(protocol.CORRELATION_KEY), protocol.encode_payload(request_id)
+        )
+    return dict(response, **{protocol.CORRELATION_KEY: request_id})
+
+
+def _correlated(request, response):
+    """Echo the request's correlation id, if it has one, in a response answered inline"""
+    if protocol.CORRELATION_KEY in request:
+        return _with_correlation_id(response, request[protocol.CORRELATION_KEY])
+    return response
+
+def _encode_batch(responses):
+    """Encode a batch response, splicing in sub-responses that are already bytes"""
+    parts = [response if isinstance(response, bytes) else protocol.encode_payload(response)
+             for response in responses]
+    return b'{"status": "ok", "responses": [' + b', '.join(parts) + b']}'
+
+def _is_stats_cursor(value):
+    """A keyset cursor is [puzzles_solved, puzzles_created, username]"""
+    return (
+        isinstance(value, list) and len(value) == 3
+        and all(isinstance(v, int) and not isinstance(v, bool) for v in value[:2])
+        and isinstance(value[2], str)
+    )
+
+def _format_user_stats(row):
+    username, solved, created, fastest, time_sum, time_count = row
+    average = time_sum / time_count if time_count else None
+    return {
+        'username': username,
+        'puzzles_solved': solved,
+        'fastest_time': round(fastest, 2) if fastest is not None else "N/A",
+        'average_time': round(average, 2) if average is not None else "N/A",
+        'puzzles_created': created
+    }
 
 class CrosswordServer:
-    def __init__(self, host='localhost', port=8888):
+    # Supported connection handling modes
+    MODES = ('threaded', 'asyncio')
+
+    def __init__(self, host='localhost', port=8888, mode='threaded', pool_config=None, backlog=128,
+                 snapshot_interval=60, warmup=None, solve_writer=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown server mode: {mode}")
         self.host = host
         self.port = port
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
-        
-        # Initialize database
-        init_db()
-        
-        # Sync crosswords to puzzles table
-        self._sync_crosswords_to_puzzles()
+        self.mode = mode
+        # All request handlers run on this pool, in both modes
+        self.pool = WorkerPool(pool_config or DEFAULT_POOL_CONFIG, ACTION_CLASSES, default_class='read')
+        # Prepared get_puzzle_detail responses keyed by puzzle id
+        self.puzzle_cache = LRUCache(**PUZZLE_CACHE_CONFIG)
+        # Serialized responses of CACHEABLE_ACTIONS keyed by (action, key)
+        self.response_cache = LRUCache(**RESPONSE_CACHE_CONFIG)
+
+        # Server-push events (messages, friend requests) to subscribed connections
+        self.events = EventHub()
+
+        # Action -> handler table; middleware runs outermost first
+        self.action_timer = ActionTimer()
+        self.dispatcher = Dispatcher()
+        self.dispatcher.register_handlers(self)
+        self.dispatcher.use(self.action_timer)
+        self.dispatcher.use(self._cache_middleware)
+
+        # Startup stage -> duration in ms
+        self.startup_timings = {}
+        started = time.perf_counter()
+
+        # Solve times per puzzle for O(log n) rank lookups
+        self.rankings = RankingIndex(self._load_puzzle_times)
+
+        # Correct solutions are written by a group-commit writer
+        self.solve_writer = SolveWriter(
+            get_db_connection, write_solves, on_error=self._solve_lost,
+            **dict(DEFAULT_SOLVE_WRITER_CONFIG, **(solve_writer or {}))
+        )
+
+        # Friendships and pending requests per user, by integer user id
+        self.social_graph = SocialGraph(self._load_user_id, self._load_relationships)
+
+        # The listening socket is bound while the database is prepared;
+        # connections arriving before accept() starts wait in the backlog
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='startup') as startup:
+            bound = startup.submit(self._timed, 'socket', self._bind_socket, backlog)
+            self._timed('schema', self._ensure_schema)
+            self._timed('sync', self._sync_crosswords_to_puzzles)
+            bound.result()
+
+        self.startup_timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("Startup took %.1f ms (%s)", self.startup_timings['total'], ', '.join(
+            f"{stage} {ms:.1f} ms" for stage, ms in self.startup_timings.items() if stage != 'total'
+        ))
+
+        # Requests are served while caches warm up; readiness waits for it
+        self.warmup_config = dict(DEFAULT_WARMUP_CONFIG, **(warmup or {}))
+        self.warmup_timings = {}
+        self.ready = threading.Event()
+        threading.Thread(target=self._warm_up, name='warmup', daemon=True).start()
+
+        # Keep historical_rankings up to date off the request path
+        self.snapshot_interval = snapshot_interval
+        threading.Thread(target=self._run_snapshot_job, name='ranking-snapshots', daemon=True).start()
         
-        print(f"Server started, listening on port {self.port}...")
+        logger.info("Server started (%s mode), listening on port %d", self.mode, self.port)
     
+    def _timed(self, stage, func, *args):
+        """Run one startup stage, recording its duration"""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.startup_timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+
+    def _bind_socket(self, backlog):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(backlog)
+
+    def _ensure_schema(self):
+        """Create the base schema if the database has none, then apply pending migrations"""
+        conn = get_db_connection()
+        try:
+            initialized, applied = ensure_schema(conn)
+            if initialized:
+                logger.info("Created base schema and sample data")
+            for version, name, duration in applied:
+                logger.info("Applied migration %d (%s) in %.1f ms", version, name, duration * 1000)
+            logger.info("Schema at version %d, %d migration(s) applied", get_schema_version(conn), len(applied))
+        finally:
+            conn.close()
+
+    def _warm_up(self):
+        """Fill caches and the ranking index before reporting readiness
+
+        A failed stage is logged and skipped: the data it would have
+        preloaded is still loaded on demand.
+        """
+        started = time.perf_counter()
+        if self.warmup_config['enabled']:
+            for stage, func in (
+                ('rankings', self._load_rankings),
+                ('puzzle_list', self._warm_puzzle_list),
+                ('puzzle_details', self._warm_puzzle_details),
+            ):
+                stage_started = time.perf_counter()
+                try:
+                    func()
+                except Exception:
+                    logger.exception("Warm-up stage %s failed", stage)
+                self.warmup_timings[stage] = round((time.perf_counter() - stage_started) * 1000, 1)
+        self.warmup_timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        self.ready.set()
+        logger.info("Ready after %.1f ms of warm-up (%s)", self.warmup_timings['total'], ', '.join(
+            f"{stage} {ms:.1f} ms" for stage, ms in self.warmup_timings.items() if stage != 'total'
+        ))
+
+    def _warm_puzzle_list(self):
+        """Cache the encoded get_puzzles response"""
+        self.dispatcher.dispatch({'action': 'get_puzzles'})
+
+    def _warm_puzzle_details(self):
+        """Cache get_puzzle_detail for the most solved puzzles"""
+        limit = self.warmup_config['top_puzzles']
+        if limit <= 0:
+            return
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(
+                "SELECT id FROM puzzles ORDER BY times_solved DESC, id LIMIT ?", (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        for (puzzle_id,) in rows:
+            self.dispatcher.dispatch({'action': 'get_puzzle_detail', 'puzzle_id': puzzle_id})
+
+    def _load_rankings(self):
+        """Load every recorded solve time into the ranking index"""
+        conn = get_db_connection()
+        try:
+            self.rankings.load_all(conn.execute("SELECT puzzle_id, time_taken FROM puzzle_records"))
+            logger.info("Loaded ranking index (%d puzzles)", self.rankings.metrics()['puzzles'])
+        finally:
+            conn.close()
+
+    def _run_snapshot_job(self):
+        """Periodically record changed ranks in historical_rankings"""
+        while True:
+            try:
+                conn = get_db_connection()
+                try:
+                    started = time.perf_counter()
+                    written = snapshot_historical_rankings(conn)
+                    if written:
+                        logger.info("Wrote %d historical ranking snapshot(s) in %.1f ms",
+                                    written, (time.perf_counter() - started) * 1000)
+                finally:
+                    conn.close()
+            except Exception:
+                logger.exception("Historical ranking snapshot failed")
+            time.sleep(self.snapshot_interval)
+
+    def _load_puzzle_times(self, puzzle_id):
+        """Solve times of one puzzle, for puzzles missing from the ranking index"""
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(
+                "SELECT time_taken FROM puzzle_records WHERE puzzle_id = ?",
+                (puzzle_id,)
+            ).fetchall()
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+
+    def _solve_lost(self, solve, error):
+        """An acknowledged write-behind solve could not be written"""
+        username, puzzle_id, time_taken, rank = solve
+        # Its time is already in the ranking index, next to solves still queued
+        if time_taken is not None:
+            self.rankings.remove(_puzzle_key(puzzle_id), time_taken)
+
+    def _load_user_id(self, username):
+        conn = get_db_connection()
+        try:
+            return load_user_id(conn, username)
+        finally:
+            conn.close()
+
+    def _load_relationships(self, user_id):
+        """Friendships and pending requests of one user, for users missing from the social graph"""
+        conn = get_db_connection()
+        try:
+            return load_relationships(conn, user_id)
+        finally:
+            conn.close()
+
     def _sync_crosswords_to_puzzles(self):
-        """Sync data from crosswords table to puzzles table"""
+        """Sync crosswords added since the last boot into the puzzles table
+
+        One joined query finds the new crosswords (with their creator's
+        username) that have no puzzle yet; puzzles and their clue geometry
+        are then inserted in batches. The highest crossword id seen is kept
+        in job_state, so later boots only look at newer crosswords.
+        """
         conn = get_db_connection()
-        cursor = conn.cursor()
         
         try:
-            # Get all crosswords
-            cursor.execute("""
-                SELECT id, name, creator_id, gridSize, clues, words 
-                FROM crosswords
-            """)
-            crosswords = cursor.fetchall()
-            
-            for cw in crosswords:
-                # Get creator username
-                cursor.execute("SELECT username FROM users WHERE id = ?", (cw['creator_id'],))
-                creator = cursor.fetchone()
-                author = creator['username'] if creator else 'system'
-                
-                # Check if puzzle already exists
-                cursor.execute("SELECT id FROM puzzles WHERE id = ?", (cw['id'],))
-                if cursor.fetchone() is None:
-                    # Convert data format to match puzzles table
-                    grid = json.loads(cw['gridSize']) if isinstance(cw['gridSize'], str) else cw['gridSize']
-                    clues = json.loads(cw['clues']) if isinstance(cw['clues'], str) else cw['clues']
-                    words = json.loads(cw['words']) if isinstance(cw['words'], str) else cw['words']
-                    
-                    # Create a simple grid for the puzzle format
-                    formatted_grid = []
-                    grid_width = int(grid[0])
-                    grid_height = int(grid[1])
-                    
-                    for i in range(grid_height):
-                        row = []
-                        for j in range(grid_width):
-                            row.append(" ")
-                        formatted_grid.append(row)
-                    
-                    # Insert into puzzles
-                    cursor.execute("""
-                        INSERT INTO puzzles (id, title, author, grid, answer, clues)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        cw['id'], 
-                        cw['name'], 
-                        author,
-                        json.dumps(formatted_grid),
-                        json.dumps(formatted_grid),  # Answer initially matches grid
-                        json.dumps(clues)
-                    ))
+            last_id = get_watermark(conn, CROSSWORD_SYNC_JOB)
+            max_id = conn.execute("SELECT MAX(id) FROM crosswords").fetchone()[0]
+            if max_id is None or max_id <= last_id:
+                logger.info("Crosswords already synced to puzzles table")
+                return
+
+            rows = conn.execute("""
+                SELECT c.id, c.name, COALESCE(u.username, 'system'), c.gridSize, c.clues
+                FROM crosswords c
+                LEFT JOIN users u ON u.id = c.creator_id
+                WHERE c.id > ? AND c.id <= ?
+                AND NOT EXISTS (SELECT 1 FROM puzzles p WHERE p.id = c.id)
+                ORDER BY c.id
+            """, (last_id, max_id)).fetchall()
+
+            puzzles = []
+            geometries = []
+            blank_grids = {}  # (width, height) -> (grid JSON, geometry)
+            for puzzle_id, name, author, grid_size, clues in rows:
+                try:
+                    grid = json.loads(grid_size) if isinstance(grid_size, str) else grid_size
+                    clues = json.loads(clues) if isinstance(clues, str) else clues
+                    size = (int(grid[0]), int(grid[1]))
+                except (ValueError, TypeError, IndexError) as e:
+                    logger.warning("Skipping crossword %s: %s", puzzle_id, e)
+                    continue
+
+                # Crosswords become blank grids; the answer initially matches the grid
+                if size not in blank_grids:
+                    formatted_grid = [[" "] * size[0] for _ in range(size[1])]
+                    blank_grids[size] = (json.dumps(formatted_grid), compute_clue_geometry(formatted_grid))
+                grid_json, geometry = blank_grids[size]
+
+                puzzles.append((puzzle_id, name, author, grid_json, grid_json, json.dumps(clues)))
+                geometries.append((puzzle_id, geometry))
+
+            conn.executemany("""
+                INSERT INTO puzzles (id, title, author, grid, answer, clues)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, puzzles)
+            insert_clue_geometry(conn, geometries)
+            set_watermark(conn, CROSSWORD_SYNC_JOB, max_id)
             
             conn.commit()
-            print(f"Synced {len(crosswords)} crosswords to puzzles table.")
-        except Exception as e:
-            print(f"Error syncing crosswords: {str(e)}")
-            traceback.print_exc()
+            logger.info("Synced %d new crosswords to puzzles table", len(puzzles))
+        except Exception:
+            logger.exception("Error syncing crosswords")
         finally:
             conn.close()
     
     def start(self):
         """Start server and accept client connections"""
+        if self.mode == 'asyncio':
+            asyncio.run(self.start_async())
+            return
+
         while True:
             client_socket, address = self.server_socket.accept()
-            print(f"Accepted connection from {address}")
+            logger.debug("Accepted connection from %s", address)
             client_thread = threading.Thread(
                 target=self.handle_client,
                 args=(client_socket,)
             )
             client_thread.start()
+
+    def shutdown(self):
+        """Stop accepting connections, commit queued solves and stop the workers
+
+        Workers exit once the requests already queued have been handled;
+        idle database connections are closed.
+        """
+        self.server_socket.close()
+        # Commit solves still queued by the write-behind writer
+        self.solve_writer.flush(timeout=10)
+        self.pool.stop()
+        get_pool(DB_PATH).close_all()
+
+    async def start_async(self):
+        """Serve all connections from one event loop
+
+        Idle connections only cost a coroutine, while the blocking handlers
+        (SQLite work) run on the bounded worker pool.
+        """
+        server = await asyncio.start_server(self.handle_client_async, sock=self.server_socket)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client_async(self, reader, writer):
+        """Handle client connection on the event loop"""
+        address = writer.get_extra_info('peername')
+        logger.debug("Accepted connection from %s", address)
+        # Connections start in legacy (bare JSON) mode until the client negotiates framing
+        framed = False
+        in_flight = set()
+        subscriptions = {}
+        outbox = StreamOutbox(asyncio.get_running_loop(), writer)
+
+        try:
+            while True:
+                try:
+                    if framed:
+                        request = await protocol.read_message(reader)
+                    else:
+                        request = await protocol.read_legacy_message(reader)
+                except protocol.ProtocolError as e:
+                    logger.warning("Protocol error: %s", e)
+                    writer.write(self._encode_response({
+                        'status': 'error',
+                        'message': str(e)
+                    }, framed))
+                    await writer.drain()
+                    if framed:
+                        # Stream position is unknown after a bad frame header
+                        return
+                    continue
+
+                if request is None:
+                    return
+
+                if request.get('action') == protocol.HELLO_ACTION:
+                    # Protocol negotiation: the reply still uses the current mode
+                    response = self.handle_hello(request)
+                    writer.write(self._encode_response(_correlated(request, response), framed))
+                    await writer.drain()
+                    if response['status'] == 'ok':
+                        framed = True
+                    continue
+
+                if request.get('action') in SUBSCRIPTION_ACTIONS:
+                    response = self._handle_subscription(request, framed, subscriptions, outbox)
+                    writer.write(self._encode_response(_correlated(request, response), framed))
+                    await writer.drain()
+                    continue
+
+                if framed and protocol.CORRELATION_KEY in request:
+                    task = asyncio.ensure_future(self._respond_pipelined(writer, request))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    continue
+
+                response = await asyncio.wrap_future(self._submit(request))
+                writer.write(self._encode_response(response, framed))
+                await writer.drain()
+
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception:
+            logger.exception("Connection error")
+
+        finally:
+            for subscription in subscriptions.values():
+                subscription.cancel()
+            # Let pipelined requests already accepted answer before closing
+            if in_flight:
+                await asyncio.wait(list(in_flight), timeout=PIPELINE_DRAIN_TIMEOUT)
+            writer.close()
+
+    async def _respond_pipelined(self, writer, request):
+        """Answer one pipelined request as soon as it completes"""
+        response = await asyncio.wrap_future(self._submit(request))
+        try:
+            writer.write(self._encode_response(
+                _with_correlation_id(response, request[protocol.CORRELATION_KEY]), True
+            ))
+            await writer.drain()
+        except ConnectionError as e:
+            logger.debug("Dropped pipelined response: %s", e)
     
     def handle_client(self, client_socket):
         """Handle client connection"""
+        # Connections start in legacy (bare JSON) mode until the client negotiates framing
+        framed = False
+        send_lock = threading.Lock()
+        in_flight = set()
+        pipeline_slots = threading.BoundedSemaphore(PIPELINE_MAX_IN_FLIGHT)
+
+        def send(response, framed):
+            with send_lock:
+                self._send_response(client_socket, response, framed)
+
+        # Events and pipelined responses are sent by the outbox's own thread,
+        # so workers never block on this socket
+        outbox = SocketOutbox(client_socket, send_lock)
+        subscriptions = {}
+
+        def pipelined_sent(sent):
+            in_flight.discard(sent)
+            pipeline_slots.release()
+            sent.set_result(None)
+
+        def queue_pipelined(future, request_id, sent):
+            # Runs on the worker that completed the request; only encodes
+            try:
+                frame = self._encode_response(_with_correlation_id(future.result(), request_id), True)
+            except Exception:
+                logger.exception("Dropped pipelined response")
+                pipelined_sent(sent)
+                return
+            outbox.put(frame, lambda: pipelined_sent(sent))
+
         try:
             while True:
-
-                # Initialize buffer for data collection
-                data_buffer = b""
-                
-                while True:
-                    chunk = client_socket.recv(4096)
-                    if not chunk:
-                        return
-                    
-                    data_buffer += chunk
-                    
-                    try:
-                        # Try to decode and parse the accumulated data
-                        request = json.loads(data_buffer.decode())
-                        break  # Successfully parsed JSON
-                    except json.JSONDecodeError as e:
-                        if "Unterminated string" not in str(e):
-                            # If it's not an unterminated string, it's a real error
-                            print(f"JSON Decode Error: {str(e)}")
-                            print(f"Received data: {data_buffer.decode()}")
-                            # Send error response
-                            error_response = json.dumps({
-                                'status': 'error',
-                                'message': f'Invalid JSON format: {str(e)}'
-                            })
-                            client_socket.send(error_response.encode())
-                            continue
-                        # If it's an unterminated string, continue receiving data
-                        continue
-                
-                if not data_buffer:
-                    break
-                
-                print("\n=== Debug: Processing client request ===")
-                print(f"Received data length: {len(data_buffer)}")
-                print(f"Request: {request}")
-                
-                # Process the request
                 try:
-                    response = self.process_request(request)
-                    
-                    # Ensure response is properly formatted
-                    if not isinstance(response, dict):
-                        response = {
-                            'status': 'error',
-                            'message': 'Invalid server response format'
-                        }
-                    
-                    # Convert response to JSON string
-                    response_json = json.dumps(response)
-                    
-                    print("\nSending response:")
-                    print(f"Response length: {len(response_json)}")
-                    print(f"Response preview: {response_json[:200]}...")
-                    
-                    # Send response
-                    client_socket.send(response_json.encode())
-                    
-                except Exception as e:
-                    print(f"Error processing request: {str(e)}")
-                    print("Full error:")
-                    import traceback
-                    traceback.print_exc()
-                    
-                    error_response = json.dumps({
+                    if framed:
+                        request = protocol.recv_message(client_socket)
+                    else:
+                        request = protocol.recv_legacy_message(client_socket)
+                except protocol.ProtocolError as e:
+                    logger.warning("Protocol error: %s", e)
+                    send({
                         'status': 'error',
-                        'message': f'Server error: {str(e)}'
-                    })
-                    client_socket.send(error_response.encode())
+                        'message': str(e)
+                    }, framed)
+                    if framed:
+                        # Stream position is unknown after a bad frame header
+                        return
+                    continue
+
+                if request is None:
+                    return
+
+                if request.get('action') == protocol.HELLO_ACTION:
+                    # Protocol negotiation: the reply still uses the current mode
+                    response = self.handle_hello(request)
+                    send(_correlated(request, response), framed)
+                    if response['status'] == 'ok':
+                        framed = True
+                    continue
+
+                if request.get('action') in SUBSCRIPTION_ACTIONS:
+                    outbox.start()
+                    response = self._handle_subscription(request, framed, subscriptions, outbox)
+                    send(_correlated(request, response), framed)
+                    continue
+
+                if framed and protocol.CORRELATION_KEY in request:
+                    outbox.start()
+                    pipeline_slots.acquire()
+                    # Done once the response has been written, not just computed
+                    sent = Future()
+                    in_flight.add(sent)
+                    self._submit(request).add_done_callback(
+                        lambda f, request_id=request[protocol.CORRELATION_KEY], sent=sent:
+                            queue_pipelined(f, request_id, sent)
+                    )
+                    continue
+
+                send(self._submit(request).result(), framed)
                 
-        except Exception as e:
-            print(f"Connection error: {str(e)}")
-            print("Full error:")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Connection error")
 
         finally:
+            for subscription in subscriptions.values():
+                subscription.cancel()
+            # Let pipelined requests already accepted answer before closing
+            _, pending = futures.wait(list(in_flight), timeout=PIPELINE_DRAIN_TIMEOUT)
+            if pending:
+                # Unblocks a send to a peer that stopped reading
+                outbox.close()
+            outbox.stop()
             client_socket.close()
-    
-    def process_request(self, request):
-        """Process client request"""
 
+    def _handle_subscription(self, request, framed, subscriptions, outbox):
+        """Subscribe or unsubscribe a connection to events addressed to a user
+
+        Events are sent as {'event': name, 'data': {...}} frames between
+        responses, so subscriptions need a framed connection.
+        subscriptions maps user_id -> Subscription for this connection.
+        """
+        user_id = request.get('user_id')
+        if not isinstance(user_id, str) or not user_id:
+            return {'status': 'error', 'message': "Field 'user_id' must be of type str"}
+
+        if request['action'] == 'unsubscribe':
+            subscription = subscriptions.pop(user_id, None)
+            if subscription is not None:
+                subscription.cancel()
+            return {'status': 'ok', 'message': f'Unsubscribed from events for {user_id}'}
+
+        if not framed:
+            return {'status': 'error', 'message': 'Subscriptions require a framed connection'}
+        if user_id not in subscriptions:
+            subscriptions[user_id] = self.events.subscribe(user_id, outbox)
+        return {'status': 'ok', 'message': f'Subscribed to events for {user_id}', 'events': list(EVENT_TYPES)}
+
+    def _submit(self, request):
+        """Start handling a request on the worker pool; returns a Future of its response
+
+        A batch fans its sub-requests out to the pool, each in its own
+        action class, and completes once all of them have.
+        """
+        if request.get('action') == protocol.BATCH_ACTION:
+            return self._submit_batch(request)
         try:
-            action = request.get('action')
-            
-            if action == 'login':
-                return self.handle_login(request)
-            elif action == 'register':
-                return self.handle_register(request)
-            elif action == 'get_puzzles':
-                return self.handle_get_puzzles()
-            elif action == 'get_puzzle_detail':
-                return self.handle_get_puzzle_detail(request)
-            elif action == 'submit_solution':
-                return self.handle_submit_solution(request)
-            elif action == 'add_puzzle':
-                # preprocess JSON data
-                if 'grid' in request:
-                    try:
-                        if isinstance(request['grid'], str):
-                            json.loads(request['grid'])  # verify JSON string
-                    except json.JSONDecodeError:
-                        request['grid'] = json.dumps(request['grid'])
-                
-                if 'answer' in request:
-                    try:
-                        if isinstance(request['answer'], str):
-                            json.loads(request['answer'])
-                    except json.JSONDecodeError:
-                        request['answer'] = json.dumps(request['answer'])
-                
-                if 'clues' in request:
-                    try:
-                        if isinstance(request['clues'], str):
-                            json.loads(request['clues'])
-                    except json.JSONDecodeError:
-                        request['clues'] = json.dumps(request['clues'])
-                
-                return self.handle_add_puzzle(request)
-            elif action == 'get_statistics':
-                return self.handle_get_statistics(request)
-            elif action == 'add_friend':
-                return self.handle_add_friend(request)
-            elif action == 'confirm_friend':
-                return self.handle_confirm_friend(request)
-            elif action == 'send_message':
-                return self.handle_send_message(request)
-            elif action == 'get_messages':
-                return self.handle_get_messages(request)
-            elif action == 'get_friend_requests':
-                return self.handle_get_friend_requests(request)
-            elif action == 'get_friends':
-                return self.handle_get_friends(request)
-            elif action == 'reject_friend':
-                return self.handle_reject_friend(request)
-            elif action == 'get_historical_rankings':
-                return self.handle_get_historical_rankings(request)
+            return self.pool.submit(request.get('action'), self._handle_request, request)
+        except ServerBusy as e:
+            return completed(self._busy_response(e))
+
+    def _submit_batch(self, request):
+        requests = request.get('requests')
+        if not isinstance(requests, list):
+            return completed({'status': 'error', 'message': "Field 'requests' must be of type list"})
+        if len(requests) > protocol.MAX_BATCH_SIZE:
+            return completed({
+                'status': 'error',
+                'message': f'Batch too large: at most {protocol.MAX_BATCH_SIZE} requests'
+            })
+
+        parts = []
+        for sub_request in requests:
+            if not isinstance(sub_request, dict) or sub_request.get('action') in (
+                    protocol.HELLO_ACTION, protocol.BATCH_ACTION):
+                parts.append(completed({'status': 'error', 'message': 'Invalid batch request'}))
             else:
-                print(f"Debug: Unknown action type received: {action}")
-                return {'status': 'error', 'message': 'Unknown action type'}
+                parts.append(self._submit(sub_request))
+
+        batch = Future()
+        gather(parts).add_done_callback(lambda done: batch.set_result(_encode_batch(done.result())))
+        return batch
+
+    def _busy_response(self, error):
+        logger.warning("Rejected request: %s", error)
+        return {'status': 'error', 'busy': True, 'message': 'Server busy, please try again'}
+
+    def _handle_request(self, request):
+        """Run a request through process_request, always returning a response
+
+        The response is a dict, or already-encoded payload bytes when it
+        came from the response cache.
+        """
+        logger.debug("Request: %s", request, extra={'body': True})
+
+        try:
+            response = self.process_request(request)
+            
+            # Ensure response is properly formatted
+            if not isinstance(response, (dict, bytes)):
+                response = {
+                    'status': 'error',
+                    'message': 'Invalid server response format'
+                }
+            return response
             
         except Exception as e:
-            print(f"Error processing request: {str(e)}")
-            print("Full error:")
-            traceback.print_exc()
-            return {'status': 'error', 'message': str(e)}
+            logger.exception("Error processing request")
+            
+            return {
+                'status': 'error',
+                'message': f'Server error: {str(e)}'
+            }
 
+    def _cache_middleware(self, name, request, call_next):
+        """Serve CACHEABLE_ACTIONS from the encoded response cache"""
+        key_func = CACHEABLE_ACTIONS.get(name)
+        if key_func is None:
+            return call_next(request)
+
+        cache_key = (name, key_func(request))
+        payload = self.response_cache.get(cache_key)
+        if payload is not None:
+            return payload
+
+        version = self.response_cache.version()
+        response = call_next(request)
+        if isinstance(response, dict) and response.get('status') == 'ok':
+            payload = protocol.encode_payload(response)
+            self.response_cache.put(cache_key, payload, version)
+            return payload
+        return response
+
+    def _encode_response(self, response, framed):
+        """Serialize a response once, using the connection's framing mode
+
+        Responses that are already bytes (from the response cache) are
+        sent as-is.
+        """
+        if isinstance(response, bytes):
+            payload = response
+        else:
+            payload = protocol.encode_payload(response)
+
+        logger.debug("Response (%d bytes): %.200s", len(payload), payload, extra={'body': True})
+
+        if framed:
+            return protocol.encode_frame(payload)
+        return payload
+
+    def _send_response(self, client_socket, response, framed):
+        """Send a response on a blocking socket"""
+        client_socket.sendall(self._encode_response(response, framed))
+
+    @action('ready')
+    def handle_ready(self, request):
+        """Report whether startup warm-up has finished"""
+        return {'status': 'ok', 'ready': self.ready.is_set(), 'warmup_ms': self.warmup_timings}
+
+    def handle_hello(self, request):
+        """Handle protocol negotiation request"""
+        version = protocol.negotiate_version(request.get('protocol_version'))
+        if version is None:
+            return {
+                'status': 'error',
+                'message': 'Unsupported protocol version',
+                'supported_versions': list(protocol.SUPPORTED_VERSIONS)
+            }
+        return {'status': 'ok', 'protocol_version': version}
     
+    def process_request(self, request):
+        """Process client request through the action dispatcher"""
+
+        try:
+            return self.dispatcher.dispatch(request)
+        except UnknownAction as e:
+            logger.warning("Unknown action type received: %s", e)
+            return {'status': 'error', 'message': 'Unknown action type'}
+        except Exception as e:
+            logger.exception("Error processing request")
+            return {'status': 'error', 'message': str(e)}
+
+    def _invalidate_puzzle(self, puzzle_id):
+        """Drop cached data derived from a puzzle after it was created or rewritten"""
+        puzzle_key = _puzzle_key(puzzle_id)
+        self.puzzle_cache.invalidate(puzzle_key)
+        self.response_cache.invalidate(('get_puzzle_detail', puzzle_key))
+        self.response_cache.invalidate(('get_puzzles', None))
+
+    @action('get_server_metrics')
+    def handle_get_server_metrics(self, request):
+        """Report worker pool, database pool, cache, per-action, startup and warm-up metrics"""
+        return {
+            'status': 'ok',
+            'metrics': {
+                'worker_pool': self.pool.metrics(),
+                'db_pool': get_pool(DB_PATH).metrics(),
+                'puzzle_cache': self.puzzle_cache.metrics(),
+                'response_cache': self.response_cache.metrics(),
+                'actions': self.action_timer.metrics(),
+                'rankings': self.rankings.metrics(),
+                'social_graph': self.social_graph.metrics(),
+                'solve_writer': self.solve_writer.metrics(),
+                'startup_ms': self.startup_timings,
+                'events': self.events.metrics(),
+                'ready': self.ready.is_set(),
+                'warmup_ms': self.warmup_timings
+            }
+        }
+
+    @action('login', schema={'username': str, 'password': str})
     def handle_login(self, request):
         """Handle login request"""
         conn = get_db_connection()
@@ -265,6 +872,7 @@ class CrosswordServer:
                     (username, password)
                 )
                 conn.commit()
+                self.social_graph.remember(cursor.lastrowid, username)
                 return {'status': 'ok', 'message': 'New user registered successfully'}
             
             if result[0] == password:
@@ -277,7 +885,8 @@ class CrosswordServer:
         finally:
             conn.close()
     
-    def handle_get_puzzles(self):
+    @action('get_puzzles')
+    def handle_get_puzzles(self, request):
         """Get puzzle list"""
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -299,15 +908,30 @@ class CrosswordServer:
         finally:
             conn.close()
     
+    @action('get_puzzle_detail', schema={'puzzle_id': (int, str)})
     def handle_get_puzzle_detail(self, request):
-        """Get puzzle details"""
+        """Get puzzle details, served from the parsed puzzle cache when possible"""
+        cache_key = _puzzle_key(request.get('puzzle_id'))
+
+        cached = self.puzzle_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+
+        version = self.puzzle_cache.version()
+        response = self._load_puzzle_detail(request)
+        if response.get('status') == 'ok':
+            self.puzzle_cache.put(cache_key, response, version)
+        return dict(response)
+
+    def _load_puzzle_detail(self, request):
+        """Load puzzle details from the database and prepare clue positions"""
         conn = get_db_connection()
         cursor = conn.cursor()
         
         try:
             puzzle_id = request['puzzle_id']
 
-            print(f"\n=== Debug: Getting puzzle details for ID {puzzle_id} ===")
+            logger.debug("Loading puzzle details for ID %s", puzzle_id)
             
             # First check data in puzzles table
             cursor.execute(
@@ -322,20 +946,14 @@ class CrosswordServer:
                     raw_clues = result[1]
                     author = result[2]
                     
-                    print("\nRaw data from database:")
-                    print(f"Grid: {raw_grid[:100]}...")
-                    print(f"Clues: {raw_clues[:100]}...")
-                    print(f"Author: {author}")
-                    
                     # Parse grid data
                     try:
                         if isinstance(raw_grid, str):
                             grid = json.loads(raw_grid)
                         else:
                             grid = raw_grid
-                        print("\nParsed grid successfully")
                     except json.JSONDecodeError as e:
-                        print(f"Error parsing grid: {str(e)}")
+                        logger.error("Error parsing grid of puzzle %s: %s", puzzle_id, e)
                         return {'status': 'error', 'message': f'Invalid grid format: {str(e)}'}
 
                     # Parse clues data
@@ -347,7 +965,7 @@ class CrosswordServer:
                         
                         # If clues is empty, try to get from crosswords table
                         if (not isinstance(clues, dict)) or (not clues.get('across') and not clues.get('down')):
-                            print("Clues data empty or invalid, attempting to get from crosswords table")
+                            logger.debug("Clues of puzzle %s empty or invalid, loading from crosswords table", puzzle_id)
                             cursor.execute(
                                 "SELECT clues FROM crosswords WHERE id = ?",
                                 (puzzle_id,)
@@ -388,6 +1006,7 @@ class CrosswordServer:
                                     (json.dumps(clues), puzzle_id)
                                 )
                                 conn.commit()
+                                self._invalidate_puzzle(puzzle_id)
                         
                         # Ensure clues has the correct structure
                         if not isinstance(clues, dict):
@@ -396,11 +1015,8 @@ class CrosswordServer:
                             clues["across"] = []
                         if "down" not in clues:
                             clues["down"] = []
-                            
-                        print("\nParsed clues successfully")
-                        print(f"Clues structure: {json.dumps(clues, indent=2)[:200]}...")
                     except json.JSONDecodeError as e:
-                        print(f"Error parsing clues: {str(e)}")
+                        logger.error("Error parsing clues of puzzle %s: %s", puzzle_id, e)
                         return {'status': 'error', 'message': f'Invalid clues format: {str(e)}'}
 
                     # Add default clues for sample puzzles if empty
@@ -450,6 +1066,7 @@ class CrosswordServer:
                             (json.dumps(clues), puzzle_id)
                         )
                         conn.commit()
+                        self._invalidate_puzzle(puzzle_id)
 
                     # Check if this is a system puzzle
                     is_system_puzzle = author == 'system'
@@ -458,8 +1075,6 @@ class CrosswordServer:
 
                     if is_system_puzzle:
                         # For system puzzles, use simple row/column based positioning
-                        print("\nProcessing system puzzle...")
-                        
                         # Process across clues
                         for i, clue in enumerate(clues['across']):
                             if isinstance(clue, dict):
@@ -493,8 +1108,6 @@ class CrosswordServer:
                                 }
                     else:
                         # For imported PUZ files, calculate positions based on black squares
-                        print("\nProcessing imported PUZ puzzle...")
-                        
                         # Process across clues
                         for i, clue in enumerate(clues['across']):
                             if not isinstance(clue, dict):
@@ -515,8 +1128,13 @@ class CrosswordServer:
                             if 'number' not in clues['down'][i]:
                                 clues['down'][i]['number'] = i + 1
                         
-                        # Calculate positions for imported puzzles
-                        self._calculate_imported_puzzle_positions(grid, clues)
+                        # Positions for imported puzzles are computed once per grid and stored
+                        geometry = load_clue_geometry(conn, puzzle_id)
+                        if geometry is None:
+                            geometry = compute_clue_geometry(grid)
+                            store_clue_geometry(conn, puzzle_id, geometry)
+                            conn.commit()
+                        apply_clue_geometry(clues, geometry)
 
                     response = {
                         'status': 'ok',
@@ -525,103 +1143,26 @@ class CrosswordServer:
                         'is_system_puzzle': is_system_puzzle
                     }
                     
-                    print("\nFinal response:")
-                    print(json.dumps(response, indent=2)[:200] + "...")
-                    
                     return response
                     
                 except Exception as e:
-                    print(f"Error processing puzzle data: {str(e)}")
-                    print("Full error:")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("Error processing puzzle %s", puzzle_id)
                     return {'status': 'error', 'message': f'Error processing puzzle: {str(e)}'}
             else:
                 return {'status': 'error', 'message': 'Puzzle not found'}
                 
         except Exception as e:
-            print(f"Error in handle_get_puzzle_detail: {str(e)}")
-            print("Full error:")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error in handle_get_puzzle_detail")
             return {'status': 'error', 'message': str(e)}
         finally:
             conn.close()
 
-    def _calculate_imported_puzzle_positions(self, grid, clues):
-        """Calculate positions for imported puzzle clues"""
-        grid_height = len(grid)
-        grid_width = len(grid[0]) if grid_height > 0 else 0
-        
-        # Calculate cell numbers
-        cell_numbers = {}
-        number = 1
-        for row in range(grid_height):
-            for col in range(grid_width):
-                cell = grid[row][col]
-                is_black = False
-                if isinstance(cell, dict):
-                    is_black = cell.get('is_black', False)
-                else:
-                    is_black = cell == '.'
-                
-                if not is_black:
-                    needs_number = False
-                    # Check if start of across word
-                    if col == 0 or (isinstance(grid[row][col-1], dict) and grid[row][col-1].get('is_black', True)):
-                        needs_number = True
-                    # Check if start of down word
-                    if row == 0 or (isinstance(grid[row-1][col], dict) and grid[row-1][col].get('is_black', True)):
-                        needs_number = True
-                    
-                    if needs_number:
-                        cell_numbers[(row, col)] = number
-                        number += 1
-        
-        # Process across clues
-        for clue in clues['across']:
-            if isinstance(clue, dict) and 'number' in clue:
-                # Find matching cell number
-                for (row, col), num in cell_numbers.items():
-                    if num == clue['number']:
-                        # Calculate length
-                        length = 0
-                        while col + length < grid_width:
-                            next_cell = grid[row][col + length]
-                            if isinstance(next_cell, dict):
-                                if next_cell.get('is_black', False):
-                                    break
-                            elif next_cell == '.':
-                                break
-                            length += 1
-                        
-                        clue['row'] = row
-                        clue['col'] = col
-                        clue['len'] = length
-                        break
-        
-        # Process down clues
-        for clue in clues['down']:
-            if isinstance(clue, dict) and 'number' in clue:
-                # Find matching cell number
-                for (row, col), num in cell_numbers.items():
-                    if num == clue['number']:
-                        # Calculate length
-                        length = 0
-                        while row + length < grid_height:
-                            next_cell = grid[row + length][col]
-                            if isinstance(next_cell, dict):
-                                if next_cell.get('is_black', False):
-                                    break
-                            elif next_cell == '.':
-                                break
-                            length += 1
-                        
-                        clue['row'] = row
-                        clue['col'] = col
-                        clue['len'] = length
-                        break
-
+    @action('submit_solution', schema={
+        'username': str,
+        'puzzle_id': (int, str),
+        'solution': JSON,
+        'time_taken': Optional((int, float))
+    })
     def handle_submit_solution(self, request):
         """Handle submitted answer"""
         conn = get_db_connection()
@@ -630,7 +1171,7 @@ class CrosswordServer:
         try:
             username = request['username']
             puzzle_id = request['puzzle_id']
-            submitted_solution = json.loads(request['solution'])
+            submitted_solution = request['solution']
             
             # Get correct answer
             cursor.execute(
@@ -642,6 +1183,8 @@ class CrosswordServer:
                 return {'status': 'error', 'message': 'Puzzle not found'}
             
             correct_answer = json.loads(result[0])
+            # Not held while the solve writer (which needs one too) is waited for
+            conn.close()
             
             # Validate answer
             is_correct = True
@@ -654,58 +1197,27 @@ class CrosswordServer:
                     break
             
             if is_correct:
-                # Update user's solved puzzles count
-
                 time_taken = request.get('time_taken', None)
 
-                cursor.execute(
-                    "UPDATE users SET puzzles_solved = puzzles_solved + 1 WHERE username = ?",
-                    (username,)
-                )
-                
-                # Update puzzle solve count
-                cursor.execute(
-                    "UPDATE puzzles SET times_solved = times_solved + 1 WHERE id = ?",
-                    (puzzle_id,)
-                )
-                
+                # Rank among all solvers of this puzzle, and how many there are
+                rank = total_solvers = None
                 if time_taken is not None:
-                    # Calculate the rank among all solvers of this puzzle
-                    cursor.execute(
-                        """
-                        SELECT COUNT(*) + 1 as rank FROM puzzle_records 
-                        WHERE puzzle_id = ? AND time_taken < ?
-                        """,
-                        (puzzle_id, time_taken)
-                    )
-                    rank_result = cursor.fetchone()
-                    rank = rank_result[0] if rank_result else 1
-                    
-                    # Get total number of solvers for this puzzle
-                    cursor.execute(
-                        "SELECT COUNT(*) as total FROM puzzle_records WHERE puzzle_id = ?",
-                        (puzzle_id,)
-                    )
-                    total_result = cursor.fetchone()
-                    total_solvers = total_result[0] if total_result else 0
-                    
-                    # Insert into puzzle_records
-                    cursor.execute(
-                        "INSERT INTO puzzle_records (username, puzzle_id, time_taken) VALUES (?, ?, ?)",
-                        (username, puzzle_id, time_taken)
-                    )
-                    
-                    # Insert into historical_rankings
-                    cursor.execute(
-                        """
-                        INSERT INTO historical_rankings 
-                        (user_id, puzzle_id, score, rank, timestamp)
-                        VALUES (?, ?, ?, ?, datetime('now'))
-                        """,
-                        (username, puzzle_id, time_taken, rank)
-                    )
+                    rank, total_solvers = self.rankings.rank_and_total(_puzzle_key(puzzle_id), time_taken)
 
-                conn.commit()
+                # Counted before it is queued, so a write-behind solve that
+                # fails later (see _solve_lost) can be taken out again
+                if time_taken is not None:
+                    self.rankings.add(_puzzle_key(puzzle_id), time_taken)
+
+                # Counters, puzzle_records, the first ranking snapshot and
+                # user_stats are written by the solve writer; depending on its
+                # durability mode this returns once committed or once queued
+                try:
+                    self.solve_writer.submit((username, puzzle_id, time_taken, rank))
+                except Exception:
+                    if time_taken is not None:
+                        self.rankings.remove(_puzzle_key(puzzle_id), time_taken)
+                    raise
                 
                 # Return rank information with the response
                 if time_taken is not None:
@@ -725,153 +1237,123 @@ class CrosswordServer:
         finally:
             conn.close()
 
+    @action('add_puzzle', schema={
+        'title': str,
+        'author': str,
+        'grid': JSON,
+        'answer': JSON,
+        'clues': JSON
+    })
     def handle_add_puzzle(self, request):
-
+        """Store a new puzzle (grid, answer and clues arrive decoded by the schema)"""
         conn = get_db_connection()
         cursor = conn.cursor()
         
         try:
 
-            print("\n=== Debug: Processing add puzzle request ===")
-            print(f"Raw request data: {request}")
-
             title = request['title']
             author = request['author']
             grid = request['grid']
-            answer = request['answer']
-            clues = request['clues']
-
-            print(f"Title: {title}")
-            print(f"Author: {author}")
-            print(f"Grid type: {type(grid)}")
-            print(f"Answer type: {type(answer)}")
-            print(f"Clues type: {type(clues)}")
-
-            # Ensure they are all stringified JSON
-            try:
-                # First try to parse if they're JSON strings
-                json.loads(grid)
-                json.loads(answer)
-                json.loads(clues)
-            except json.JSONDecodeError:
-                # If they're not already JSON strings, convert them
-                if not isinstance(grid, str):
-                    grid = json.dumps(grid)
-                if not isinstance(answer, str):
-                    answer = json.dumps(answer)
-                if not isinstance(clues, str):
-                    clues = json.dumps(clues)
-
-            print("\nValidated data:")
-            print(f"Grid: {grid[:100]}...")
-            print(f"Answer: {answer[:100]}...")
-            print(f"Clues: {clues[:100]}...")
 
             cursor.execute(
                 """
                 INSERT INTO puzzles (title, author, grid, answer, clues)
                 VALUES (?, ?, ?, ?, ?)
                 """,
-                (title, author, grid, answer, clues)
+                (title, author, json.dumps(grid), json.dumps(request['answer']), json.dumps(request['clues']))
             )
+            puzzle_id = cursor.lastrowid
+
+            # Precompute clue positions so reads never rescan the grid
+            try:
+                store_clue_geometry(conn, puzzle_id, compute_clue_geometry(grid))
+            except (ValueError, TypeError, IndexError, AttributeError) as e:
+                logger.warning("Could not precompute clue geometry for puzzle %s: %s", puzzle_id, e)
 
             cursor.execute(
                 "UPDATE users SET puzzles_created = puzzles_created + 1 WHERE username = ?",
                 (author,)
             )
-            
+
             conn.commit()
+            self._invalidate_puzzle(puzzle_id)
 
-            print("\nSuccessfully added puzzle to database")
+            logger.info("Puzzle %s '%s' added by %s", puzzle_id, title, author)
             return {'status': 'ok', 'message': 'Puzzle added successfully'}
         except Exception as e:
-            print(f"\nError in handle_add_puzzle: {str(e)}")
-            print("Full error:")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error in handle_add_puzzle")
 
             return {'status': 'error', 'message': str(e)}
         finally:
             conn.close()
 
+    @action('get_statistics', schema={
+        'username': Optional(str),
+        'mode': Optional(str),
+        'limit': Optional(int),
+        'cursor': Optional(list),
+        'around': Optional(int)
+    })
     def handle_get_statistics(self, request):
-        """Get statistics"""
+        """Get statistics, one page of the leaderboard at a time
+
+        mode 'page' (default) returns up to `limit` users after `cursor`
+        (the next_cursor of the previous page). mode 'top' returns the top
+        `limit` users plus the `around` users on either side of the caller.
+        """
         conn = get_db_connection()
         cursor = conn.cursor()
         
         try:
             username = request.get('username')
-            
-            # Get current user's statistics
+            mode = request.get('mode') or 'page'
+            if mode not in ('page', 'top'):
+                return {'status': 'error', 'message': f"Unknown statistics mode: {mode}"}
+            limit = request.get('limit')
+            limit = min(max(STATS_PAGE_SIZE if limit is None else limit, 1), STATS_MAX_PAGE_SIZE)
+            after = request.get('cursor')
+            if after is not None and not _is_stats_cursor(after):
+                return {'status': 'error', 'message': 'Invalid statistics cursor'}
+
+            # Per-user aggregates are maintained in user_stats by the write paths
             cursor.execute("""
-                SELECT puzzles_solved, puzzles_created 
-                FROM users 
+                SELECT puzzles_solved, puzzles_created, latest_time
+                FROM user_stats
                 WHERE username = ?
             """, (username,))
-            
+
             user_row = cursor.fetchone()
             current_user_stats = {
                 'puzzles_solved': user_row[0] if user_row else 0,
-                'puzzles_created': user_row[1] if user_row else 0
+                'puzzles_created': user_row[1] if user_row else 0,
+                'latest_time': user_row[2] if user_row else None
             }
 
-            cursor.execute("""
-                SELECT time_taken FROM puzzle_records 
-                WHERE username = ? 
-                ORDER BY solved_at DESC 
-                LIMIT 1
-            """, (username,))
-            latest_time_row = cursor.fetchone()
-            current_user_stats['latest_time'] = latest_time_row[0] if latest_time_row else None
-
-            # Get all users' statistics
-            cursor.execute("""
-                SELECT username, puzzles_solved, puzzles_created 
-                FROM users 
-                ORDER BY puzzles_solved DESC, puzzles_created DESC
-            """)
-
-            user_rows = cursor.fetchall()
-
-            cursor.execute("""
-                SELECT username, MIN(time_taken) 
-                FROM puzzle_records 
-                GROUP BY username
-            """)
-            fastest_times = dict(cursor.fetchall())
-
-            cursor.execute("""
-                SELECT username, AVG(time_taken)
-                FROM puzzle_records
-                GROUP BY username
-            """)
-            average_times = dict(cursor.fetchall())
-
-            all_users_stats = []
-            for row in user_rows:
-                fastest = fastest_times.get(row[0])
-                average = average_times.get(row[0])
-
-                user_stats = {
-                    'username': row[0],
-                    'puzzles_solved': row[1],
-                    'fastest_time': round(fastest, 2) if fastest is not None else "N/A",
-                    'average_time': round(average, 2) if average is not None else "N/A",
-                    'puzzles_created': row[2]
-                }
-                all_users_stats.append(user_stats)
-            
-            return {
+            rows = get_stats_page(conn, limit, None if mode == 'top' else after)
+            response = {
                 'status': 'ok',
                 'current_user_stats': current_user_stats,
-                'all_users_stats': all_users_stats
+                'all_users_stats': [_format_user_stats(row) for row in rows],
+                'next_cursor': stats_key(rows[-1]) if len(rows) == limit else None
             }
+
+            if mode == 'top':
+                around = request.get('around')
+                around = min(max(STATS_NEIGHBORHOOD if around is None else around, 0), STATS_MAX_PAGE_SIZE)
+                rank, neighborhood = get_stats_neighborhood(conn, username, around)
+                response['rank'] = rank
+                response['neighborhood'] = [
+                    dict(_format_user_stats(row), rank=position) for position, row in neighborhood
+                ]
+
+            return response
             
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
         finally:
             conn.close()
     
+    @action('send_message', schema={'sender_id': str, 'receiver_id': str, 'message': str})
     def handle_send_message(self, request):
         """Handle sending a message from one user to another"""
         try:
@@ -889,272 +1371,373 @@ class CrosswordServer:
                 "INSERT INTO messages (sender_id, receiver_id, message) VALUES (?, ?, ?)",
                 (sender_id, receiver_id, message)
             )
+            message_id = cursor.lastrowid
             conn.commit()
             conn.close()
 
+            self.events.publish(receiver_id, 'message', {
+                'id': message_id,
+                'sender_id': sender_id,
+                'receiver_id': receiver_id,
+                'message': message
+            })
+
             return {'status': 'ok', 'message': 'Message sent successfully'}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
 
 
+    @action('add_friend', schema={'user_id': str, 'friend_id': str})
     def handle_add_friend(self, request):
-        """Handle adding a friend (send friend request)"""
+        """Handle adding a friend (send friend request)
+
+        The request is a single INSERT ... SELECT resolving both usernames;
+        the pair's primary key rejects duplicates, so the relationship is
+        only looked up to explain a failure.
+        """
+        conn = get_db_connection()
+
         try:
             user_id = request['user_id']
             friend_id = request['friend_id']
 
-            print(f"\nDebug: Processing friend request from {user_id} to {friend_id}")
+            logger.debug("Processing friend request from %s to %s", user_id, friend_id)
 
             if not user_id or not friend_id:
                 return {'status': 'error', 'message': 'Both user_id and friend_id are required'}
+            if user_id == friend_id:
+                return {'status': 'error', 'message': 'You cannot add yourself as a friend'}
 
-            # Check if the user and friend exist in the database
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM users WHERE username = ?", (user_id,))
-            user = cursor.fetchone()
-            
-            cursor.execute("SELECT * FROM users WHERE username = ?", (friend_id,))
-            friend = cursor.fetchone()
-
-            if not user:
-                return {'status': 'error', 'message': 'User does not exist'}
-            if not friend:
+            try:
+                row = insert_request(conn, user_id, friend_id)
+            except sqlite3.IntegrityError:
+                conn.rollback()
+                return {'status': 'error', 'message': self._existing_relationship_message(user_id, friend_id)}
+
+            if row is None:
+                conn.rollback()
+                if self.social_graph.user_id(user_id) is None:
+                    return {'status': 'error', 'message': 'User does not exist'}
                 return {'status': 'error', 'message': 'Friend does not exist'}
 
-            # Check if friend request already exists
-            cursor.execute(
-                "SELECT status FROM friends WHERE user_id = ? AND friend_id = ?",
-                (user_id, friend_id)
-            )
-            existing = cursor.fetchone()
-            
-            if existing:
-                print(f"Debug: Existing friend request found with status: {existing[0]}")
-                if existing[0] == 'pending':
-                    return {'status': 'error', 'message': 'Friend request already sent'}
-                elif existing[0] == 'confirmed':
-                    return {'status': 'error', 'message': 'Already friends'}
-
-            # Add the friend request to the database
-            cursor.execute(
-                "INSERT INTO friends (user_id, friend_id, status) VALUES (?, ?, 'pending')",
-                (user_id, friend_id)
-            )
             conn.commit()
-            
-            # Debug log to confirm data insertion
-            print(f"Debug: Friend request added - {user_id} -> {friend_id}, status: pending")
-            
-            # Verify the insertion
-            cursor.execute(
-                "SELECT * FROM friends WHERE user_id = ? AND friend_id = ?",
-                (user_id, friend_id)
-            )
-            result = cursor.fetchone()
-            print(f"Debug: Verification - Friend request in database: {result}")
-                  
-            conn.close()
+            logger.debug("Friend request added: %s -> %s, status: pending", user_id, friend_id)
+
+            user_low, user_high, user = row
+            friend = user_high if user == user_low else user_low
+            self.social_graph.remember(user, user_id)
+            self.social_graph.remember(friend, friend_id)
+            self.social_graph.request(user, friend)
+            self.events.publish(friend_id, 'friend_request', {'user_id': user_id})
 
             return {'status': 'ok', 'message': 'Friend request sent'}
         except Exception as e:
-            print(f"Debug: Error in handle_add_friend: {str(e)}")
+            logger.exception("Error in handle_add_friend")
             return {'status': 'error', 'message': str(e)}
+        finally:
+            conn.close()
 
+    def _existing_relationship_message(self, user_id, friend_id):
+        """Why a friend request between two existing users was refused"""
+        existing = self.social_graph.relationship(
+            self.social_graph.user_id(user_id), self.social_graph.user_id(friend_id)
+        )
+        logger.debug("Existing relationship found: %s", existing)
+        if existing == SENT:
+            return 'Friend request already sent'
+        elif existing == RECEIVED:
+            return f'{friend_id} already sent you a friend request'
+        return 'Already friends'
+
+    @action('confirm_friend', schema={'user_id': str, 'friend_id': str})
     def handle_confirm_friend(self, request):
         """Handle confirming a friend request"""
+        conn = get_db_connection()
+
         try:
             user_id = request['user_id']  # B
             friend_id = request['friend_id']  # A
 
-            print(f"\nDebug: Confirming friend request between {user_id} and {friend_id}")
+            logger.debug("Confirming friend request between %s and %s", user_id, friend_id)
 
             if not user_id or not friend_id:
                 return {'status': 'error', 'message': 'Both user_id and friend_id are required'}
 
-            # Confirm the friend request in the database by updating the status to 'confirmed'
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # First, verify that there is a pending friend request
-            cursor.execute(
-                "SELECT * FROM friends WHERE user_id = ? AND friend_id = ? AND status = 'pending'",
-                (friend_id, user_id)  # A -> B (original request)
-            )
-            pending_request = cursor.fetchone()
-            
-            if not pending_request:
-                conn.close()
+            # Confirm the pending request A -> B; the pair's single row becomes the friendship
+            row = confirm_request(conn, user_id, friend_id)
+            if row is None:
+                conn.rollback()
                 return {'status': 'error', 'message': 'No pending friend request found'}
-            
-            # Update the original friend request (A -> B)
-            cursor.execute(
-                "UPDATE friends SET status = 'confirmed' WHERE user_id = ? AND friend_id = ?",
-                (friend_id, user_id)  # A -> B
-            )
-            
-            # Add the reverse friendship (B -> A)
-            cursor.execute(
-                "INSERT OR REPLACE INTO friends (user_id, friend_id, status) VALUES (?, ?, 'confirmed')",
-                (user_id, friend_id)  # B -> A
-            )
-            
             conn.commit()
-            
-            # Debug: Verify the friendship status
-            cursor.execute("""
-                SELECT user_id, friend_id, status 
-                FROM friends 
-                WHERE (user_id = ? AND friend_id = ?) 
-                   OR (user_id = ? AND friend_id = ?)
-            """, (user_id, friend_id, friend_id, user_id))
-            
-            friendship_records = cursor.fetchall()
-            print(f"Debug: Friendship records after confirmation: {friendship_records}")
-            
-            conn.close()
+
+            user_low, user_high, friend = row
+            user = user_high if friend == user_low else user_low
+            self.social_graph.remember(user, user_id)
+            self.social_graph.remember(friend, friend_id)
+            self.social_graph.confirm(user, friend)
+            self.events.publish(friend_id, 'friend_confirmed', {'user_id': user_id})
 
             return {'status': 'ok', 'message': f'{friend_id} confirmed as a friend of {user_id}'}
         except Exception as e:
-            print(f"Debug: Error in handle_confirm_friend: {str(e)}")
+            logger.exception("Error in handle_confirm_friend")
+            return {'status': 'error', 'message': str(e)}
+        finally:
+            conn.close()
+
+    @action('reject_friend', schema={'user_id': str, 'friend_id': str})
+    def handle_reject_friend(self, request):
+        """Handle rejecting a friend request"""
+        conn = get_db_connection()
+
+        try:
+            user_id = request['user_id']  # B
+            friend_id = request['friend_id']  # A
+
+            # Remove the pending request A -> B
+            row = delete_request(conn, user_id, friend_id)
+            if row is None:
+                conn.rollback()
+                return {'status': 'error', 'message': 'No pending friend request found'}
+            conn.commit()
+
+            user_low, user_high, friend = row
+            self.social_graph.remove(user_high if friend == user_low else user_low, friend)
+
+            return {'status': 'ok', 'message': f'Friend request from {friend_id} rejected'}
+        except Exception as e:
+            logger.exception("Error in handle_reject_friend")
             return {'status': 'error', 'message': str(e)}
+        finally:
+            conn.close()
         
+    @action('get_friends', schema={'user_id': str})
     def handle_get_friends(self, request):
         """Handle fetching the user's friends list"""
         try:
             user_id = request['user_id']
 
-            print(f"\nDebug: Fetching friends list for user {user_id}")
+            logger.debug("Fetching friends list for user %s", user_id)
 
             if not user_id:
                 return {'status': 'error', 'message': 'user_id is required'}
 
-            # Fetch the friends from the database
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Get friends in both directions (where user is either user_id or friend_id)
-            # Use DISTINCT to prevent duplicates
-            cursor.execute("""
-                SELECT DISTINCT
-                    CASE 
-                        WHEN user_id = ? THEN friend_id 
-                        WHEN friend_id = ? THEN user_id 
-                    END as friend
-                FROM friends 
-                WHERE (user_id = ? OR friend_id = ?) 
-                AND status = 'confirmed'
-            """, (user_id, user_id, user_id, user_id))
-            
-            friends = cursor.fetchall()
-            
-            # Debug log
-            print(f"Debug: Found friends for {user_id}: {friends}")
-            
-            conn.close()
+            # Friends come from the in-memory adjacency of the social graph
+            user = self.social_graph.user_id(user_id)
+            friend_list = self.social_graph.friends(user) if user is not None else []
 
-            # Extract friend usernames from query results and remove duplicates using set
-            friend_list = list(set([friend[0] for friend in friends if friend[0] is not None]))
-            
-            # Debug log
-            print(f"Debug: Processed friend list: {friend_list}")
+            logger.debug("Found %d friends for %s", len(friend_list), user_id)
 
             return {'status': 'ok', 'friends': friend_list}
         except Exception as e:
-            print(f"Debug: Error in handle_get_friends: {str(e)}")
+            logger.exception("Error in handle_get_friends")
             return {'status': 'error', 'message': str(e)}
 
+    @action('get_friend_requests', schema={'user_id': str})
     def handle_get_friend_requests(self, request):
         """Handle fetching all pending friend requests for a user"""
         try:
             user_id = request['user_id']
 
-            print(f"\nDebug: Fetching friend requests for user {user_id}")
+            logger.debug("Fetching friend requests for user %s", user_id)
 
             if not user_id:
                 return {'status': 'error', 'message': 'user_id is required'}
 
-            # Retrieve pending friend requests for the user
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Debug: Show all friend records for this user
-            cursor.execute("SELECT * FROM friends WHERE friend_id = ?", (user_id,))
-            all_records = cursor.fetchall()
-            print(f"Debug: All friend records for {user_id}: {all_records}")
-            
-            cursor.execute(
-                "SELECT user_id, friend_id FROM friends WHERE friend_id = ? AND status = 'pending'",
-                (user_id,)
-            )
-            pending_requests = cursor.fetchall()
+            user = self.social_graph.user_id(user_id)
+            requesters = self.social_graph.friend_requests(user) if user is not None else []
             
             # Debug log to show the pending requests
-            print(f"Debug: Retrieved pending friend requests for {user_id}: {pending_requests}")
-
-            conn.close()
+            logger.debug("Retrieved %d pending friend requests for %s", len(requesters), user_id)
 
             # Return the pending friend requests
             return {
                 'status': 'ok',
-                'pending_requests': [{'user_id': req[0], 'friend_id': req[1]} for req in pending_requests]
+                'pending_requests': [{'user_id': requester, 'friend_id': user_id} for requester in requesters]
             }
         except Exception as e:
-            print(f"Debug: Error in handle_get_friend_requests: {str(e)}")
+            logger.exception("Error in handle_get_friend_requests")
             return {'status': 'error', 'message': str(e)}
 
+    @action('get_messages', schema={
+        'user_id': str,
+        'friend_id': str,
+        'limit': Optional(int),
+        'before': Optional(int),
+        'after': Optional(int),
+        'since': Optional(int)
+    })
     def handle_get_messages(self, request):
-        """Handle fetching all messages between two users"""
+        """Handle fetching a page of the conversation between two users
+
+        Without a cursor the latest `limit` messages are returned. `before`
+        pages back through older history and `after` forward from a message
+        id; `since` returns the messages newer than an id (up to the maximum
+        page size) for incremental refreshes. Messages are oldest first and
+        `has_more` tells whether the history continues in the paging
+        direction (older for the latest page and `before`).
+        """
         try:
             user_id = request['user_id']
             friend_id = request['friend_id']
 
-            print(f"\nDebug: Fetching messages between {user_id} and {friend_id}")
+            logger.debug("Fetching messages between %s and %s", user_id, friend_id)
 
             if not user_id or not friend_id:
                 return {'status': 'error', 'message': 'Both user_id and friend_id are required'}
 
+            cursors = [name for name in MESSAGE_CURSORS if request.get(name) is not None]
+            if len(cursors) > 1:
+                return {'status': 'error', 'message': f"Only one of {', '.join(MESSAGE_CURSORS)} may be given"}
+            cursor_name = cursors[0] if cursors else None
+
+            default_limit = MESSAGES_MAX_PAGE_SIZE if cursor_name == 'since' else MESSAGES_PAGE_SIZE
+            limit = request.get('limit')
+            limit = min(max(default_limit if limit is None else limit, 1), MESSAGES_MAX_PAGE_SIZE)
+
+            if cursor_name is None:
+                condition, direction = '1', 'DESC'
+            elif cursor_name == 'before':
+                condition, direction = 'id < :cursor', 'DESC'
+            else:
+                condition, direction = 'id > :cursor', 'ASC'
+
             # Check if they are friends
+            user = self.social_graph.user_id(user_id)
+            friend = self.social_graph.user_id(friend_id)
+            if user is None or friend is None or not self.social_graph.are_friends(user, friend):
+                return {'status': 'error', 'message': 'You can only view messages with your friends'}
+
             conn = get_db_connection()
             cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT * FROM friends 
-                WHERE ((user_id = ? AND friend_id = ?) OR (user_id = ? AND friend_id = ?))
-                AND status = 'confirmed'
-            """, (user_id, friend_id, friend_id, user_id))
-            
-            friendship = cursor.fetchone()
-            
-            if not friendship:
-                conn.close()
-                return {'status': 'error', 'message': 'You can only view messages with your friends'}
 
-            # Retrieve messages between user_id and friend_id
-            # Use DISTINCT to prevent duplicates and order by timestamp
-            cursor.execute("""
-                SELECT DISTINCT sender_id, receiver_id, message, timestamp 
-                FROM messages 
-                WHERE (sender_id = ? AND receiver_id = ?) OR (sender_id = ? AND receiver_id = ?) 
-                ORDER BY timestamp
-            """, (user_id, friend_id, friend_id, user_id))
-            
+            # One row past the page tells whether there is more
+            cursor.execute(
+                CONVERSATION_PAGE_QUERY.format(condition=condition, direction=direction),
+                {'user': user_id, 'friend': friend_id, 'cursor': request.get(cursor_name), 'limit': limit + 1}
+            )
             messages = cursor.fetchall()
             
-            print(f"Debug: Found {len(messages)} messages")
-            
             conn.close()
 
-            # Return the messages
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            if direction == 'DESC':
+                messages.reverse()
+
+            logger.debug("Found %d messages", len(messages))
+
             return {
                 'status': 'ok',
-                'messages': [{'sender_id': msg[0], 'receiver_id': msg[1], 'message': msg[2], 'timestamp': msg[3]} for msg in messages]
+                'messages': [
+                    {'id': msg[0], 'sender_id': msg[1], 'receiver_id': msg[2], 'message': msg[3], 'timestamp': msg[4]}
+                    for msg in messages
+                ],
+                'has_more': has_more
             }
         except Exception as e:
-            print(f"Debug: Error in handle_get_messages: {str(e)}")
+            logger.exception("Error in handle_get_messages")
+            return {'status': 'error', 'message': str(e)}
+
+    @action('get_inbox', schema={'user_id': str, 'limit': Optional(int), 'mark_read': Optional(bool)})
+    def handle_get_inbox(self, request):
+        """Handle fetching the latest messages and unread count of every conversation
+
+        One query covers all confirmed friends (from the social graph, passed
+        as a JSON array): messages sent and received
+        are read through the (sender_id, receiver_id) and (receiver_id,
+        sender_id) indexes, and a window over each conversation keeps the
+        last `limit` messages. Friends without messages come last;
+        `has_more` marks conversations with older history (see get_messages).
+        With mark_read, the received messages returned are marked read in
+        the same transaction.
+        """
+        conn = get_db_connection()
+
+        try:
+            user_id = request['user_id']
+            if not user_id:
+                return {'status': 'error', 'message': 'user_id is required'}
+            limit = request.get('limit')
+            limit = min(max(INBOX_MESSAGES if limit is None else limit, 1), INBOX_MAX_MESSAGES)
+
+            # Friends come from the social graph; the query reads only messages
+            user = self.social_graph.user_id(user_id)
+            friends = json.dumps(self.social_graph.friends(user) if user is not None else [])
+
+            mark_read = request.get('mark_read')
+            if mark_read:
+                # Read and mark in one write transaction, so only what was counted is marked
+                conn.execute("BEGIN IMMEDIATE")
+
+            rows = conn.execute("""
+                WITH friend_ids AS (
+                    SELECT value AS friend FROM json_each(:friends)
+                ),
+                conversation AS (
+                    SELECT id, sender_id, receiver_id, message, timestamp, read, receiver_id AS friend
+                    FROM messages
+                    WHERE sender_id = :user AND receiver_id IN friend_ids
+                    UNION ALL
+                    SELECT id, sender_id, receiver_id, message, timestamp, read, sender_id AS friend
+                    FROM messages
+                    WHERE receiver_id = :user AND sender_id IN friend_ids
+                ),
+                ranked AS (
+                    SELECT *,
+                           ROW_NUMBER() OVER (PARTITION BY friend ORDER BY timestamp DESC, id DESC) AS position,
+                           SUM(receiver_id = :user AND NOT read) OVER (PARTITION BY friend) AS unread,
+                           MAX(id) OVER (PARTITION BY friend) AS latest_id,
+                           COUNT(*) OVER (PARTITION BY friend) AS total
+                    FROM conversation
+                )
+                SELECT f.friend, r.id, r.sender_id, r.receiver_id, r.message, r.timestamp, r.unread,
+                       r.total > :limit
+                FROM friend_ids f
+                LEFT JOIN ranked r ON r.friend = f.friend AND r.position <= :limit
+                ORDER BY r.latest_id IS NULL, r.latest_id DESC, f.friend, r.position DESC
+            """, {'user': user_id, 'friends': friends, 'limit': limit}).fetchall()
+
+            conversations = []
+            for friend, message_id, sender_id, receiver_id, message, timestamp, unread, has_more in rows:
+                if not conversations or conversations[-1]['friend'] != friend:
+                    conversations.append({
+                        'friend': friend,
+                        'unread': unread or 0,
+                        'has_more': bool(has_more),
+                        'messages': []
+                    })
+                if sender_id is not None:
+                    conversations[-1]['messages'].append({
+                        'id': message_id,
+                        'sender_id': sender_id,
+                        'receiver_id': receiver_id,
+                        'message': message,
+                        'timestamp': timestamp
+                    })
+
+            if mark_read:
+                # Only received messages that are returned; older unread ones stay unread
+                returned = [
+                    m['id'] for c in conversations if c['unread']
+                    for m in c['messages'] if m['receiver_id'] == user_id
+                ]
+                if returned:
+                    conn.execute("""
+                        UPDATE messages SET read = 1
+                        WHERE id IN (SELECT value FROM json_each(:ids))
+                          AND receiver_id = :user
+                          AND NOT read
+                    """, {'ids': json.dumps(returned), 'user': user_id})
+                conn.commit()
+
+            return {'status': 'ok', 'conversations': conversations}
+        except Exception as e:
+            logger.exception("Error in handle_get_inbox")
             return {'status': 'error', 'message': str(e)}
+        finally:
+            conn.close()
 
+    @action('get_historical_rankings', schema={'username': Optional(str)})
     def handle_get_historical_rankings(self, request):
         """Handle fetching historical rankings for a user"""
         conn = get_db_connection()
@@ -1166,26 +1749,28 @@ class CrosswordServer:
             if not username:
                 return {'status': 'error', 'message': 'Username is required'}
             
-            # Get user's historical puzzle records with ranking information
+            # Get user's historical puzzle records with ranking information.
+            # Ranks are computed per puzzle with window functions over the
+            # (puzzle_id, time_taken) index; only puzzles the user solved are ranked.
             cursor.execute("""
                 WITH RankedRecords AS (
                     SELECT 
-                        pr1.username,
-                        pr1.puzzle_id,
-                        p.title as puzzle_title,
-                        pr1.time_taken,
-                        pr1.solved_at,
-                        (SELECT COUNT(*) + 1 FROM puzzle_records pr2 
-                         WHERE pr2.puzzle_id = pr1.puzzle_id AND pr2.time_taken < pr1.time_taken) as rank,
-                        (SELECT COUNT(*) FROM puzzle_records pr3 
-                         WHERE pr3.puzzle_id = pr1.puzzle_id) as total_solvers
-                    FROM puzzle_records pr1
-                    JOIN puzzles p ON pr1.puzzle_id = p.id
-                    WHERE pr1.username = ?
+                        username,
+                        puzzle_id,
+                        time_taken,
+                        solved_at,
+                        RANK() OVER (PARTITION BY puzzle_id ORDER BY time_taken) as rank,
+                        COUNT(*) OVER (PARTITION BY puzzle_id) as total_solvers
+                    FROM puzzle_records
+                    WHERE puzzle_id IN (SELECT puzzle_id FROM puzzle_records WHERE username = ?)
                 )
-                SELECT * FROM RankedRecords
-                ORDER BY solved_at DESC
-            """, (username,))
+                SELECT r.username, r.puzzle_id, p.title as puzzle_title, r.time_taken,
+                       r.solved_at, r.rank, r.total_solvers
+                FROM RankedRecords r
+                JOIN puzzles p ON r.puzzle_id = p.id
+                WHERE r.username = ?
+                ORDER BY r.solved_at DESC
+            """, (username, username))
             
             records = []
             for row in cursor.fetchall():
@@ -1199,30 +1784,48 @@ class CrosswordServer:
                     'total_solvers': row[6]
                 })
             
-            # Also save these records in the historical_rankings table
-            for record in records:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO historical_rankings 
-                    (user_id, puzzle_id, score, rank, timestamp)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (username, record['puzzle_id'], record['time_taken'], 
-                      record['rank'], record['solved_at']))
-            
-            conn.commit()
-            
             return {
                 'status': 'ok',
                 'records': records
             }
         except Exception as e:
-            print(f"Error in handle_get_historical_rankings: {str(e)}")
-            print("Full error:")
-            traceback.print_exc()
+            logger.exception("Error in handle_get_historical_rankings")
             return {'status': 'error', 'message': str(e)}
         finally:
             conn.close()
 
 
 if __name__ == "__main__":
-    server = CrosswordServer()
-    server.start()
+    parser = argparse.ArgumentParser(description="Crossword game server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--mode', choices=CrosswordServer.MODES, default='threaded',
+                        help="connection handling: one thread per client, or a single asyncio event loop")
+    parser.add_argument('--snapshot-interval', type=float, default=60,
+                        help="seconds between historical ranking snapshot runs")
+    parser.add_argument('--warmup-top-puzzles', type=int, default=DEFAULT_WARMUP_CONFIG['top_puzzles'],
+                        help="number of most solved puzzles whose details are cached at startup")
+    parser.add_argument('--no-warmup', action='store_true',
+                        help="skip the startup warm-up and report ready immediately")
+    parser.add_argument('--solve-durability', choices=DURABILITY_MODES,
+                        default=DEFAULT_SOLVE_WRITER_CONFIG['durability'],
+                        help="commit each solve before answering (sync), commit in batches before "
+                             "answering (group), or answer at once and commit in batches (write_behind)")
+    parser.add_argument('--solve-flush-ms', type=float, default=DEFAULT_SOLVE_WRITER_CONFIG['flush_interval'] * 1000,
+                        help="milliseconds a batch of solves is collected before it is committed")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--log-sample-rate', type=float, default=DEFAULT_BODY_SAMPLE_RATE,
+                        help="fraction of request/response bodies logged at DEBUG level")
+    args = parser.parse_args()
+
+    setup_logging(args.log_level, args.log_sample_rate)
+
+    server = CrosswordServer(host=args.host, port=args.port, mode=args.mode,
+                             snapshot_interval=args.snapshot_interval,
+                             warmup={'enabled': not args.no_warmup, 'top_puzzles': args.warmup_top_puzzles},
+                             solve_writer={'durability': args.solve_durability,
+                                           'flush_interval': args.solve_flush_ms / 1000})
+    try:
+        server.start()
+    finally:
+        server.shutdown()
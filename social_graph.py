@@ -0,0 +1,117 @@
+import threading
+
+# Relationship of a user to another, as seen from the user's side
+CONFIRMED = 'confirmed'
+SENT = 'sent'          # request sent, awaiting the other user
+RECEIVED = 'received'  # request received, awaiting this user
+
+
+class SocialGraph:
+    """Per-user adjacency of the friendships table, keyed by integer user id
+
+    Answers friend lists, "are these two friends?" and pending request
+    checks with dictionary lookups. The database (friendships) stays the
+    source of truth: a user's relationships are loaded from it the first
+    time the user is queried, and the update methods are called only after
+    the change has been committed.
+
+    Args:
+        load_user: callable(username) -> user id, or None if not registered
+        load_relationships: callable(user_id) -> iterable of
+            (other_id, other_username, requester_id, status) rows
+    """
+
+    def __init__(self, load_user, load_relationships):
+        self.load_user = load_user
+        self.load_relationships = load_relationships
+        self._ids = {}    # username -> user id
+        self._names = {}  # user id -> username
+        self._adjacency = {}  # user id -> {other id: CONFIRMED | SENT | RECEIVED}
+        self._lock = threading.Lock()
+
+    def _remember(self, user_id, username):
+        self._ids[username] = user_id
+        self._names[user_id] = username
+
+    def remember(self, user_id, username):
+        """Record a user's id, e.g. one returned by a write"""
+        with self._lock:
+            self._remember(user_id, username)
+
+    def _get(self, user_id):
+        adjacency = self._adjacency.get(user_id)
+        if adjacency is None:
+            adjacency = {}
+            for other_id, other_name, requester, status in self.load_relationships(user_id):
+                self._remember(other_id, other_name)
+                if status == 'confirmed':
+                    adjacency[other_id] = CONFIRMED
+                else:
+                    adjacency[other_id] = SENT if requester == user_id else RECEIVED
+            self._adjacency[user_id] = adjacency
+        return adjacency
+
+    def user_id(self, username):
+        """Integer id of a registered user, or None"""
+        with self._lock:
+            user_id = self._ids.get(username)
+            if user_id is None:
+                # Unknown names are not remembered: the user may register later
+                user_id = self.load_user(username)
+                if user_id is not None:
+                    self._remember(user_id, username)
+            return user_id
+
+    def relationship(self, user_id, other_id):
+        """CONFIRMED, SENT, RECEIVED or None, from user_id's side"""
+        with self._lock:
+            return self._get(user_id).get(other_id)
+
+    def are_friends(self, user_id, other_id):
+        with self._lock:
+            return self._get(user_id).get(other_id) == CONFIRMED
+
+    def friends(self, user_id):
+        """Usernames of a user's confirmed friends"""
+        with self._lock:
+            return [self._names[other] for other, state in self._get(user_id).items() if state == CONFIRMED]
+
+    def friend_requests(self, user_id):
+        """Usernames of users whose requests to user_id are pending"""
+        with self._lock:
+            return [self._names[other] for other, state in self._get(user_id).items() if state == RECEIVED]
+
+    def _set(self, user_id, other_id, state):
+        # Users not loaded yet read the committed row when first queried
+        adjacency = self._adjacency.get(user_id)
+        if adjacency is not None:
+            if state is None:
+                adjacency.pop(other_id, None)
+            else:
+                adjacency[other_id] = state
+
+    def request(self, requester_id, other_id):
+        """Record a committed friend request"""
+        with self._lock:
+            self._set(requester_id, other_id, SENT)
+            self._set(other_id, requester_id, RECEIVED)
+
+    def confirm(self, user_id, other_id):
+        """Record a committed confirmation"""
+        with self._lock:
+            self._set(user_id, other_id, CONFIRMED)
+            self._set(other_id, user_id, CONFIRMED)
+
+    def remove(self, user_id, other_id):
+        """Record a committed removal (rejected request)"""
+        with self._lock:
+            self._set(user_id, other_id, None)
+            self._set(other_id, user_id, None)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'users': len(self._adjacency),
+                'edges': sum(len(adjacency) for adjacency in self._adjacency.values()),
+                'names': len(self._ids)
+            }
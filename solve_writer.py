@@ -0,0 +1,178 @@
+import logging
+import queue
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import Future
+
+logger = logging.getLogger('crossword.solve_writer')
+
+# How a correct solve is made durable before it is acknowledged:
+#   sync          committed in its own transaction by the request thread
+#   group         queued and committed with whatever else is queued (the next
+#                 batch forms while one commits); the request waits for it
+#   write_behind  queued and acknowledged at once; batches are collected for
+#                 flush_interval, so a crash can lose the queued solves
+DURABILITY_MODES = ('sync', 'group', 'write_behind')
+
+DEFAULT_SOLVE_WRITER_CONFIG = {
+    'durability': 'write_behind',
+    'flush_interval': 0.005,    # Seconds a write-behind batch keeps collecting solves
+    'max_batch': 500,           # Solves per transaction at most
+    'max_pending': 10000,       # Queued solves before submitters block
+}
+
+# Queue entry asking the writer to commit what it has right away
+_FLUSH = object()
+
+
+class SolveWriter:
+    """Group commit of solve records on a single writer thread
+
+    Queued solves are written in batches of up to max_batch, one
+    transaction each, so a burst of submissions costs one commit per batch
+    instead of one per request. Write-behind batches keep collecting for
+    flush_interval; group batches take only what is already queued, as
+    their submitters are waiting. If a batch fails, its
+    solves are retried one transaction each so one bad record does not
+    take the rest with it.
+
+    Args:
+        connect: callable() -> database connection (closed after each batch)
+        write: callable(conn, solves) writing a batch; the writer commits
+        on_error: callable(solve, error) for solves that could not be
+            written after they were acknowledged (write_behind)
+    """
+
+    def __init__(self, connect, write, durability='write_behind', flush_interval=0.005,
+                 max_batch=500, max_pending=10000, on_error=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.connect = connect
+        self.write = write
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.on_error = on_error
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.solves = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.failed = 0
+        self.total_commit = 0.0
+        self.max_commit = 0.0
+
+        self._thread = None
+        if durability != 'sync':
+            self._thread = threading.Thread(target=self._run, name='solve-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, solve):
+        """Record a solve according to the durability mode
+
+        Returns once the solve is committed (sync, group) or queued
+        (write_behind). Errors of sync and group writes are raised here.
+        """
+        if self.durability == 'sync':
+            self._commit([solve])
+            return
+        future = Future()
+        self._queue.put((solve, future))
+        if self.durability == 'group':
+            future.result()
+
+    def flush(self, timeout=None):
+        """Wait until every solve queued so far has been committed (or has failed)"""
+        if self._thread is None:
+            return True
+        future = Future()
+        self._queue.put((_FLUSH, future))
+        try:
+            future.result(timeout)
+            return True
+        except futures.TimeoutError:
+            return False
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            interval = self.flush_interval if self.durability == 'write_behind' else 0
+            deadline = time.perf_counter() + interval
+            while len(batch) < self.max_batch and batch[-1][0] is not _FLUSH:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        entries = [(solve, future) for solve, future in batch if solve is not _FLUSH]
+        if len(entries) == 1:
+            self._write_one(*entries[0])
+        elif entries:
+            try:
+                self._commit([solve for solve, _ in entries])
+                failed = False
+            except Exception:
+                logger.exception("Writing %d solves failed, retrying one by one", len(entries))
+                failed = True
+            for solve, future in entries:
+                if failed:
+                    self._write_one(solve, future)
+                else:
+                    future.set_result(None)
+        for solve, future in batch:
+            if solve is _FLUSH:
+                future.set_result(None)
+
+    def _write_one(self, solve, future):
+        try:
+            self._commit([solve])
+            future.set_result(None)
+        except Exception as e:
+            logger.exception("Dropping solve %r", solve)
+            with self._lock:
+                self.failed += 1
+            future.set_exception(e)
+            if self.durability == 'write_behind' and self.on_error is not None:
+                self.on_error(solve, e)
+
+    def _commit(self, solves):
+        started = time.perf_counter()
+        conn = self.connect()
+        try:
+            self.write(conn, solves)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.solves += len(solves)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(solves))
+            self.total_commit += elapsed
+            self.max_commit = max(self.max_commit, elapsed)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'durability': self.durability,
+                'queued': self._queue.qsize(),
+                'solves': self.solves,
+                'batches': self.batches,
+                'avg_batch': round(self.solves / self.batches, 2) if self.batches else 0,
+                'largest_batch': self.largest_batch,
+                'failed': self.failed,
+                'avg_commit_ms': round(self.total_commit / self.batches * 1000, 3) if self.batches else 0,
+                'max_commit_ms': round(self.max_commit * 1000, 3)
+            }
@@ -0,0 +1,46 @@
+import logging
+import os
+import sys
+
+import pytest
+
+# The server and database modules are imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import pool  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so database/crossword.db is a new file"""
+    (tmp_path / 'database').mkdir()
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    # Pools are shared per (relative) path; drop the one opened on this file
+    with pool._pools_lock:
+        pools = list(pool._pools.values())
+        pool._pools.clear()
+    for p in pools:
+        p.close_all()
+
+
+@pytest.fixture
+def server(workdir, request):
+    """A CrosswordServer on a fresh database, driven through its dispatcher
+
+    Indirect parameters are passed on as constructor arguments.
+    """
+    from server import CrosswordServer
+
+    logging.disable(logging.CRITICAL)
+    options = dict(port=0, warmup={'enabled': False}, snapshot_interval=3600)
+    options.update(getattr(request, 'param', {}))
+    srv = CrosswordServer(**options)
+    yield srv
+    srv.shutdown()
+    logging.disable(logging.NOTSET)
+
+
+def call(server, action, **request):
+    """Dispatch one request and return its response dict"""
+    return server.dispatcher.dispatch(dict(request, action=action))
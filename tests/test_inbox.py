@@ -0,0 +1,79 @@
+import pytest
+
+from conftest import call
+from database import get_db_connection
+
+
+@pytest.fixture
+def users(server):
+    for name in ('alice', 'bob', 'carol', 'mallory'):
+        assert call(server, 'login', username=name, password='pw')['status'] == 'ok'
+    for friend in ('bob', 'carol'):
+        assert call(server, 'add_friend', user_id='alice', friend_id=friend)['status'] == 'ok'
+        assert call(server, 'confirm_friend', user_id=friend, friend_id='alice')['status'] == 'ok'
+
+
+def send(server, sender, receiver, text):
+    assert call(server, 'send_message', sender_id=sender, receiver_id=receiver, message=text)['status'] == 'ok'
+
+
+def unread(sender, receiver):
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            "SELECT message FROM messages WHERE sender_id = ? AND receiver_id = ? AND NOT read ORDER BY id",
+            (sender, receiver)
+        ).fetchall()
+        return [row[0] for row in rows]
+    finally:
+        conn.close()
+
+
+def conversations(response):
+    assert response['status'] == 'ok', response
+    return {c['friend']: c for c in response['conversations']}
+
+
+def test_mark_read_only_marks_returned_messages(server, users):
+    for i in range(3):
+        send(server, 'bob', 'alice', f"bob {i}")
+    send(server, 'alice', 'bob', 'reply')
+    send(server, 'carol', 'alice', 'carol 0')
+    send(server, 'mallory', 'alice', 'not a friend')
+
+    inbox = conversations(call(server, 'get_inbox', user_id='alice', limit=2, mark_read=True))
+
+    assert [m['message'] for m in inbox['bob']['messages']] == ['bob 2', 'reply']
+    assert inbox['bob']['unread'] == 3
+    assert inbox['bob']['has_more']
+    assert inbox['carol']['unread'] == 1
+    assert 'mallory' not in inbox
+    # Older history past the limit and messages from non-friends stay unread
+    assert unread('bob', 'alice') == ['bob 0', 'bob 1']
+    assert unread('carol', 'alice') == []
+    assert unread('mallory', 'alice') == ['not a friend']
+    # Messages alice sent are bob's to read
+    assert unread('alice', 'bob') == ['reply']
+
+
+def test_inbox_without_mark_read_changes_nothing(server, users):
+    send(server, 'bob', 'alice', 'hello')
+
+    for _ in range(2):
+        inbox = conversations(call(server, 'get_inbox', user_id='alice'))
+        assert inbox['bob']['unread'] == 1
+    assert unread('bob', 'alice') == ['hello']
+
+
+def test_counts_after_mark_read(server, users):
+    for i in range(3):
+        send(server, 'bob', 'alice', f"bob {i}")
+
+    call(server, 'get_inbox', user_id='alice', limit=1, mark_read=True)
+    inbox = conversations(call(server, 'get_inbox', user_id='alice', limit=0))
+
+    assert inbox['bob']['unread'] == 2
+    assert [m['message'] for m in inbox['bob']['messages']] == ['bob 2']
+    # Friends without messages are listed last
+    assert list(inbox) == ['bob', 'carol']
+    assert inbox['carol']['messages'] == []
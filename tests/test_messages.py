@@ -0,0 +1,95 @@
+import pytest
+
+from conftest import call
+from database import get_db_connection
+from server import CONVERSATION_PAGE_QUERY
+
+
+@pytest.fixture
+def history(server):
+    """Six messages between alice and bob, oldest first, plus one with carol"""
+    for name in ('alice', 'bob', 'carol'):
+        call(server, 'login', username=name, password='pw')
+    for friend in ('bob', 'carol'):
+        call(server, 'add_friend', user_id='alice', friend_id=friend)
+        call(server, 'confirm_friend', user_id=friend, friend_id='alice')
+    for i in range(6):
+        sender, receiver = ('alice', 'bob') if i % 2 else ('bob', 'alice')
+        call(server, 'send_message', sender_id=sender, receiver_id=receiver, message=f"m{i}")
+        if i == 2:
+            call(server, 'send_message', sender_id='carol', receiver_id='alice', message='elsewhere')
+    return [f"m{i}" for i in range(6)]
+
+
+def get_page(server, **request):
+    response = call(server, 'get_messages', user_id='alice', friend_id='bob', **request)
+    assert response['status'] == 'ok', response
+    return [m['message'] for m in response['messages']], response['has_more'], response['messages']
+
+
+def test_latest_page(server, history):
+    texts, has_more, _ = get_page(server, limit=4)
+    assert texts == history[2:]
+    assert has_more
+
+
+def test_paging_back_to_the_first_message(server, history):
+    texts, has_more, messages = get_page(server, limit=3)
+    assert (texts, has_more) == (history[3:], True)
+
+    # The remaining history fills the page exactly, so it is the last one
+    texts, has_more, messages = get_page(server, limit=3, before=messages[0]['id'])
+    assert (texts, has_more) == (history[:3], False)
+
+    texts, has_more, _ = get_page(server, limit=3, before=messages[0]['id'])
+    assert (texts, has_more) == ([], False)
+
+
+def test_paging_forward(server, history):
+    _, _, messages = get_page(server)
+    first = messages[0]['id']
+
+    texts, has_more, _ = get_page(server, limit=2, after=first)
+    assert (texts, has_more) == (history[1:3], True)
+    texts, has_more, _ = get_page(server, limit=5, after=first)
+    assert (texts, has_more) == (history[1:], False)
+
+
+def test_since(server, history):
+    _, _, messages = get_page(server)
+    texts, has_more, _ = get_page(server, since=messages[3]['id'])
+    assert (texts, has_more) == (history[4:], False)
+    texts, has_more, _ = get_page(server, since=messages[-1]['id'])
+    assert (texts, has_more) == ([], False)
+
+
+def test_limit_zero_returns_one_message(server, history):
+    texts, has_more, messages = get_page(server, limit=0)
+    assert (texts, has_more) == (history[-1:], True)
+    texts, has_more, _ = get_page(server, limit=0, before=messages[0]['id'])
+    assert (texts, has_more) == (history[-2:-1], True)
+
+
+def test_one_cursor_at_most(server, history):
+    response = call(server, 'get_messages', user_id='alice', friend_id='bob', before=10, after=1)
+    assert response['status'] == 'error'
+
+
+def test_only_friends(server, history):
+    call(server, 'login', username='mallory', password='pw')
+    response = call(server, 'get_messages', user_id='mallory', friend_id='alice')
+    assert response == {'status': 'error', 'message': 'You can only view messages with your friends'}
+
+
+def test_page_query_uses_the_conversation_index(server, history):
+    conn = get_db_connection()
+    try:
+        plan = conn.execute(
+            'EXPLAIN QUERY PLAN ' + CONVERSATION_PAGE_QUERY.format(condition='id < :cursor', direction='DESC'),
+            {'user': 'alice', 'friend': 'bob', 'cursor': 100, 'limit': 4}
+        ).fetchall()
+    finally:
+        conn.close()
+    searches = [row[3] for row in plan if 'messages' in row[3]]
+    assert len(searches) == 2
+    assert all('idx_messages_sender_receiver_id' in detail for detail in searches)
@@ -0,0 +1,116 @@
+import sqlite3
+
+import pytest
+
+from database import migrations
+from database.init_db import initialize
+from database.migrations import MIGRATIONS, ensure_schema, get_schema_version, run_migrations
+
+LATEST = MIGRATIONS[-1][0]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'crossword.db'))
+    yield conn
+    conn.close()
+
+
+def names(conn, kind):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+
+
+def test_fresh_database(conn):
+    initialized, applied = ensure_schema(conn)
+
+    assert initialized
+    assert [version for version, _, _ in applied] == [version for version, _, _ in MIGRATIONS]
+    assert get_schema_version(conn) == LATEST
+    assert {'friendships', 'user_stats', 'puzzle_clue_geometry', 'job_state'} <= names(conn, 'table')
+    assert 'friends' not in names(conn, 'table')
+    assert {
+        'idx_puzzle_records_puzzle_time', 'idx_messages_sender_receiver_id',
+        'idx_messages_receiver_sender_time', 'idx_user_stats_order', 'idx_friendships_high'
+    } <= names(conn, 'index')
+    assert {'trg_users_user_stats', 'trg_users_user_stats_counters'} <= names(conn, 'trigger')
+    # The sample users have statistics rows
+    users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    assert users > 0
+    assert conn.execute("SELECT COUNT(*) FROM user_stats").fetchone()[0] == users
+
+
+def test_second_run_applies_nothing(conn):
+    ensure_schema(conn)
+    users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    assert ensure_schema(conn) == (False, [])
+    # Sample data is not added again, nor the pre-migration friends table
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == users
+    assert 'friends' not in names(conn, 'table')
+
+
+def test_legacy_database(conn):
+    # A database created before migrations existed: base schema, no schema_version
+    initialize(conn)
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, 'x')", [('alice',), ('bob',), ('carol',)])
+    conn.executemany(
+        "INSERT INTO friends (user_id, friend_id, status) VALUES (?, ?, ?)",
+        [
+            # A confirmed friendship is stored once per direction
+            ('alice', 'bob', 'confirmed'),
+            ('bob', 'alice', 'confirmed'),
+            ('carol', 'alice', 'pending'),
+            ('alice', 'ghost', 'pending'),
+        ]
+    )
+    conn.executemany(
+        "INSERT INTO puzzle_records (username, puzzle_id, time_taken) VALUES ('alice', 1, ?)",
+        [(30.0,), (10.0,), (None,)]
+    )
+    conn.commit()
+    ids = dict(conn.execute("SELECT username, id FROM users"))
+
+    initialized, applied = ensure_schema(conn)
+
+    assert initialized
+    assert len(applied) == len(MIGRATIONS)
+    assert 'friends' not in names(conn, 'table')
+    assert set(conn.execute("SELECT user_low, user_high, requester, status FROM friendships")) == {
+        (min(ids['alice'], ids['bob']), max(ids['alice'], ids['bob']), ids['alice'], 'confirmed'),
+        (min(ids['alice'], ids['carol']), max(ids['alice'], ids['carol']), ids['carol'], 'pending'),
+    }
+    assert conn.execute(
+        "SELECT fastest_time, time_sum, time_count FROM user_stats WHERE username = 'alice'"
+    ).fetchone() == (10.0, 40.0, 2)
+    assert conn.execute("SELECT COUNT(*) FROM user_stats").fetchone()[0] == \
+        conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def test_user_stats_follow_users(conn):
+    ensure_schema(conn)
+    conn.execute("INSERT INTO puzzle_records (username, puzzle_id, time_taken) VALUES ('dave', 1, 12.5)")
+    conn.execute("INSERT INTO users (username, password) VALUES ('dave', 'x')")
+    conn.execute("UPDATE users SET puzzles_solved = 3, puzzles_created = 2 WHERE username = 'dave'")
+
+    assert conn.execute(
+        "SELECT puzzles_solved, puzzles_created, fastest_time, time_count FROM user_stats WHERE username = 'dave'"
+    ).fetchone() == (3, 2, 12.5, 1)
+
+
+def test_failed_migration_leaves_no_changes(conn):
+    ensure_schema(conn)
+
+    def fail(conn):
+        raise RuntimeError('step failed')
+
+    with pytest.raises(RuntimeError, match='step failed'):
+        run_migrations(conn, [(LATEST + 1, 'broken', ["CREATE TABLE half_done (x)", fail])])
+
+    assert 'half_done' not in names(conn, 'table')
+    assert get_schema_version(conn) == LATEST
+
+
+def test_old_sqlite_is_refused(conn, monkeypatch):
+    monkeypatch.setattr(sqlite3, 'sqlite_version_info', (3, 31, 1))
+    with pytest.raises(RuntimeError, match='or newer is required'):
+        migrations.check_sqlite(conn)
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import protocol
+from protocol import LegacyDecoder, ProtocolError
+
+
+def test_frame_round_trip():
+    frame = protocol.encode_message({'action': 'hello', 'version': 1})
+    length = protocol.decode_header(frame[:protocol.HEADER.size])
+    assert length == len(frame) - protocol.HEADER.size
+    assert protocol.decode_payload(frame[protocol.HEADER.size:]) == {'action': 'hello', 'version': 1}
+
+
+def test_header_rejects_unsupported_version():
+    with pytest.raises(ProtocolError, match='Unsupported protocol version'):
+        protocol.decode_header(protocol.HEADER.pack(99, 0))
+
+
+def test_header_rejects_oversized_frame():
+    with pytest.raises(ProtocolError, match='Frame too large'):
+        protocol.decode_header(protocol.HEADER.pack(protocol.PROTOCOL_VERSION, protocol.MAX_FRAME_SIZE + 1))
+
+
+def test_payload_rejects_invalid_json():
+    with pytest.raises(ProtocolError, match='Invalid JSON payload'):
+        protocol.decode_payload(b'{"action":')
+
+
+@pytest.mark.parametrize('requested, expected', [(1, 1), ('1', 1), (5, 1), (0, None), ('x', None), (None, None)])
+def test_negotiate_version(requested, expected):
+    assert protocol.negotiate_version(requested) == expected
+
+
+def test_legacy_message_in_one_chunk():
+    decoder = LegacyDecoder()
+    assert decoder.feed(b'{"action": "get_puzzles"}') == {'action': 'get_puzzles'}
+    assert decoder.buffer == bytearray()
+
+
+def test_legacy_message_split_across_chunks():
+    decoder = LegacyDecoder()
+    payload = json.dumps({'action': 'send_message', 'message': 'a } inside'}).encode()
+    split = payload.index(b'}') + 1
+    chunks = [payload[:5], payload[5:split], payload[split:]]
+    # The second chunk ends in the '}' inside the string, so is not complete yet
+    assert decoder.feed(chunks[0]) is None
+    assert decoder.feed(chunks[1]) is None
+    assert decoder.feed(chunks[2]) == {'action': 'send_message', 'message': 'a } inside'}
+
+
+def test_legacy_unterminated_object_waits():
+    decoder = LegacyDecoder()
+    assert decoder.feed(b'  {"action": "login", "username": "a"') is None
+    assert decoder.feed(b'\n') is None
+
+
+@pytest.mark.parametrize('payload', [b'[1, 2, 3]', b'"text"', b'42', b'nonsense'])
+def test_legacy_rejects_non_object_at_once(payload):
+    decoder = LegacyDecoder()
+    with pytest.raises(ProtocolError, match='Invalid JSON format'):
+        decoder.feed(payload)
+    # The decoder starts over for the next message
+    assert decoder.feed(b'{"action": "ready"}') == {'action': 'ready'}
+
+
+def test_legacy_rejects_payload_over_max_size(monkeypatch):
+    monkeypatch.setattr(protocol, 'MAX_FRAME_SIZE', 64)
+    decoder = LegacyDecoder()
+    assert decoder.feed(b'{"message": "' + b'x' * 40) is None
+    with pytest.raises(ProtocolError, match='Message too large'):
+        decoder.feed(b'x' * 40)
+    assert decoder.buffer == bytearray()
+
+
+def test_legacy_rejects_invalid_object():
+    decoder = LegacyDecoder()
+    with pytest.raises(ProtocolError):
+        decoder.feed(b'{"action": get_puzzles}')
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import call
+from database import get_db_connection
+from database.solves import write_solves
+from solve_writer import SolveWriter
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def commit(self):
+        self.log.append('commit')
+
+    def rollback(self):
+        self.log.append('rollback')
+
+    def close(self):
+        pass
+
+
+def make_writer(durability, written, log=None, **options):
+    """A writer storing solves in `written`, failing on any batch containing 'bad'"""
+    log = [] if log is None else log
+
+    def write(conn, solves):
+        if 'bad' in solves:
+            raise ValueError('bad solve')
+        written.extend(solves)
+
+    return SolveWriter(lambda: FakeConnection(log), write, durability=durability, **options)
+
+
+def test_failed_batch_is_retried_one_by_one():
+    written, lost = [], []
+    writer = make_writer(
+        'write_behind', written, flush_interval=0.2,
+        on_error=lambda solve, error: lost.append((solve, str(error)))
+    )
+    for solve in ('a', 'bad', 'b'):
+        writer.submit(solve)
+    assert writer.flush(timeout=5)
+
+    assert written == ['a', 'b']
+    assert lost == [('bad', 'bad solve')]
+    metrics = writer.metrics()
+    assert metrics['failed'] == 1
+    assert metrics['solves'] == 2
+
+
+@pytest.mark.parametrize('durability', ['sync', 'group'])
+def test_durable_modes_raise_to_the_submitter(durability):
+    written, log, lost = [], [], []
+    writer = make_writer(durability, written, log, on_error=lambda solve, error: lost.append(solve))
+
+    writer.submit('a')
+    with pytest.raises(ValueError, match='bad solve'):
+        writer.submit('bad')
+
+    assert written == ['a']
+    assert log == ['commit', 'rollback']
+    # on_error is only for solves that were already acknowledged
+    assert lost == []
+
+
+def test_group_batches_commit_together():
+    written, log = [], []
+    writing, release = threading.Event(), threading.Event()
+
+    def write(conn, solves):
+        writing.set()
+        release.wait(5)
+        written.append(list(solves))
+
+    writer = SolveWriter(lambda: FakeConnection(log), write, durability='group')
+    first = threading.Thread(target=writer.submit, args=(0,))
+    first.start()
+    assert writing.wait(5)
+    # The others queue up while the first commit is in progress
+    others = [threading.Thread(target=writer.submit, args=(i,)) for i in range(1, 4)]
+    for thread in others:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while writer.metrics()['queued'] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in [first] + others:
+        thread.join(5)
+
+    assert written[0] == [0]
+    assert sorted(written[1]) == [1, 2, 3]
+    assert log == ['commit', 'commit']
+
+
+def solution(puzzle_id):
+    conn = get_db_connection()
+    try:
+        return json.loads(conn.execute("SELECT answer FROM puzzles WHERE id = ?", (puzzle_id,)).fetchone()[0])
+    finally:
+        conn.close()
+
+
+def recorded_times(puzzle_id):
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("SELECT time_taken FROM puzzle_records WHERE puzzle_id = ?", (puzzle_id,)).fetchall()
+        return sorted(row[0] for row in rows if row[0] is not None)
+    finally:
+        conn.close()
+
+
+def fail_on_time(bad_time):
+    def write(conn, solves):
+        if any(time_taken == bad_time for _, _, time_taken, _ in solves):
+            raise RuntimeError('disk full')
+        write_solves(conn, solves)
+    return write
+
+
+def submit(server, puzzle_id, time_taken):
+    return call(
+        server, 'submit_solution', username='solver', puzzle_id=puzzle_id,
+        solution=solution(puzzle_id), time_taken=time_taken
+    )
+
+
+@pytest.mark.parametrize('server', [{'solve_writer': {'flush_interval': 0.05}}], indirect=True)
+def test_lost_write_behind_solve_leaves_the_ranking_index(server):
+    server.solve_writer.write = fail_on_time(13)
+    before = recorded_times(1)
+
+    for time_taken in (10, 13, 20):
+        assert submit(server, 1, time_taken)['status'] == 'ok'
+    assert server.solve_writer.flush(timeout=5)
+
+    assert recorded_times(1) == sorted(before + [10, 20])
+    assert server.rankings.rank_and_total(1, 1000) == (len(before) + 3, len(before) + 2)
+
+
+@pytest.mark.parametrize('server', [{'solve_writer': {'durability': 'group'}}], indirect=True)
+def test_failed_group_solve_is_taken_out_of_the_ranking_index(server):
+    server.solve_writer.write = fail_on_time(13)
+    before = recorded_times(1)
+
+    assert submit(server, 1, 10)['status'] == 'ok'
+    assert submit(server, 1, 13) == {'status': 'error', 'message': 'disk full'}
+    response = submit(server, 1, 20)
+
+    assert response['status'] == 'ok'
+    # The failed solve is neither stored nor counted for later ranks
+    assert response['total_solvers'] == len(before) + 2
+    assert recorded_times(1) == sorted(before + [10, 20])
+    assert server.rankings.rank_and_total(1, 1000) == (len(before) + 3, len(before) + 2)
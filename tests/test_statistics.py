@@ -0,0 +1,105 @@
+import pytest
+
+from conftest import call
+from database import get_db_connection
+
+
+@pytest.fixture
+def leaderboard(server):
+    """Twelve more users with solved counts that tie, plus the sample users
+
+    Returns every username in listing order.
+    """
+    conn = get_db_connection()
+    try:
+        for i in range(12):
+            conn.execute("INSERT INTO users (username, password) VALUES (?, 'x')", (f"player{i:02d}",))
+            # user_stats follows the counters through its trigger
+            conn.execute(
+                "UPDATE users SET puzzles_solved = ?, puzzles_created = ? WHERE username = ?",
+                (i % 4, i % 2, f"player{i:02d}")
+            )
+        conn.commit()
+        rows = conn.execute(
+            "SELECT username FROM users ORDER BY puzzles_solved DESC, puzzles_created DESC, username"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def page(server, **request):
+    response = call(server, 'get_statistics', **request)
+    assert response['status'] == 'ok', response
+    return response
+
+
+def test_pages_cover_every_user_once(server, leaderboard):
+    seen, cursor = [], None
+    while True:
+        response = page(server, limit=5, cursor=cursor)
+        seen += [row['username'] for row in response['all_users_stats']]
+        cursor = response['next_cursor']
+        if cursor is None:
+            break
+    assert seen == leaderboard
+
+
+def test_page_ending_on_the_last_user(server, leaderboard):
+    first = page(server, limit=len(leaderboard))
+    assert [row['username'] for row in first['all_users_stats']] == leaderboard
+    # A full page always has a cursor; the page after it is empty and ends the listing
+    assert first['next_cursor'] is not None
+    last = page(server, limit=len(leaderboard), cursor=first['next_cursor'])
+    assert last['all_users_stats'] == []
+    assert last['next_cursor'] is None
+
+
+def test_limit_zero_returns_one_row(server, leaderboard):
+    response = page(server, limit=0)
+    assert [row['username'] for row in response['all_users_stats']] == leaderboard[:1]
+    assert response['next_cursor'] is not None
+
+
+def test_default_limit(server, leaderboard):
+    response = page(server)
+    assert [row['username'] for row in response['all_users_stats']] == leaderboard
+    assert response['next_cursor'] is None
+
+
+def test_invalid_cursor(server, leaderboard):
+    for cursor in ([1, 2], [1, 'x', 'player00'], [True, 0, 'player00']):
+        response = call(server, 'get_statistics', cursor=cursor)
+        assert response == {'status': 'error', 'message': 'Invalid statistics cursor'}
+
+
+def test_top_with_neighborhood(server, leaderboard):
+    username = leaderboard[6]
+    response = page(server, mode='top', limit=3, username=username, around=2)
+
+    assert [row['username'] for row in response['all_users_stats']] == leaderboard[:3]
+    assert response['rank'] == 7
+    assert [(row['rank'], row['username']) for row in response['neighborhood']] == \
+        [(rank, leaderboard[rank - 1]) for rank in range(5, 10)]
+
+
+def test_top_around_zero_is_only_the_caller(server, leaderboard):
+    username = leaderboard[4]
+    response = page(server, mode='top', username=username, around=0)
+    assert response['rank'] == 5
+    assert [(row['rank'], row['username']) for row in response['neighborhood']] == [(5, username)]
+
+
+def test_top_neighborhood_at_the_edges(server, leaderboard):
+    first = page(server, mode='top', username=leaderboard[0], around=3)
+    assert [row['rank'] for row in first['neighborhood']] == [1, 2, 3, 4]
+    last = page(server, mode='top', username=leaderboard[-1], around=3)
+    total = len(leaderboard)
+    assert [row['rank'] for row in last['neighborhood']] == list(range(total - 3, total + 1))
+
+
+def test_top_for_unknown_user(server, leaderboard):
+    response = page(server, mode='top', username='nobody')
+    assert response['rank'] is None
+    assert response['neighborhood'] == []
+    assert response['current_user_stats']['puzzles_solved'] == 0
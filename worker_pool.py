@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class ServerBusy(Exception):
+    """Raised when a request cannot be queued because its action class is full"""
+
+
+class ActionQueue:
+    """A bounded queue served by a fixed number of worker threads
+
+    The worker count is the concurrency limit for every action in this
+    class; once `queue_size` requests are waiting, new ones are rejected
+    immediately instead of piling up.
+    """
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"{name}-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, func, *args):
+        """Queue a call and return a Future for its result"""
+        future = Future()
+        try:
+            self.queue.put_nowait((future, func, args, time.perf_counter()))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise ServerBusy(f"Too many pending '{self.name}' requests")
+        return future
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            future, func, args, enqueued_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started_at = time.perf_counter()
+            wait = started_at - enqueued_at
+            with self.lock:
+                self.in_flight += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+                    self.total_run += time.perf_counter() - started_at
+
+    def stop(self):
+        for _ in self.threads:
+            self.queue.put(None)
+
+    def metrics(self):
+        with self.lock:
+            started = self.completed + self.in_flight
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self.queue.qsize(),
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self.total_wait / started * 1000, 3) if started else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'avg_run_ms': round(self.total_run / self.completed * 1000, 3) if self.completed else 0.0
+            }
+
+
+class WorkerPool:
+    """Routes calls to per-action-class queues
+
+    Args:
+        classes (dict): action class name -> {'workers': int, 'queue_size': int}
+        action_classes (dict): action name -> action class name
+        default_class (str): class used for actions not listed in action_classes
+    """
+
+    def __init__(self, classes, action_classes, default_class):
+        if default_class not in classes:
+            raise ValueError(f"Unknown default action class: {default_class}")
+        self.queues = {
+            name: ActionQueue(name, config['workers'], config['queue_size'])
+            for name, config in classes.items()
+        }
+        self.action_classes = action_classes
+        self.default_class = default_class
+
+    def class_for(self, action):
+        return self.action_classes.get(action, self.default_class)
+
+    def submit(self, action, func, *args):
+        """Queue a call for `action`; raises ServerBusy if its class is full"""
+        return self.queues[self.class_for(action)].submit(func, *args)
+
+    def stop(self):
+        for action_queue in self.queues.values():
+            action_queue.stop()
+
+    def metrics(self):
+        return {name: action_queue.metrics() for name, action_queue in self.queues.items()}
+
+
+def completed(result):
+    """A Future that already holds result"""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def gather(futures):
+    """A Future of the list of results of futures, done when all of them are"""
+    combined = Future()
+    if not futures:
+        combined.set_result([])
+        return combined
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def part_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            combined.set_result([future.result() for future in futures])
+        except Exception as e:
+            combined.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(part_done)
+    return combined